@@ -35,7 +35,7 @@ def set_client(client=None, **kwargs):
     ----------
     client : ClientBase or str
         Instance of a client from ClientBase,
-        or a string from ['native', 'multiprocessing', 'ipyparallel'].
+        or a string from ['native', 'multiprocessing', 'ipyparallel', 'dask'].
         If string, the respective constructor is called with `kwargs`.
 
     """
@@ -149,7 +149,9 @@ class BatchHandler:
         Parameters
         ----------
         batch : dict
-            Overriding values for the batch.
+            Overriding values for the batch. The values are not copied, so they must not be
+            modified after the submission (e.g. by reusing a buffer) as the batch may be
+            computed lazily.
 
         """
         batch = batch or {}
@@ -228,6 +230,24 @@ class ClientBase:
         """
         raise NotImplementedError
 
+    def scatter(self, data):
+        """Send `data` to the workers in advance for use in several tasks.
+
+        The returned handle can be passed to `apply` in place of `data`, so that data shared
+        by many tasks is not serialized separately for each of them. By default the data
+        itself is returned.
+
+        Parameters
+        ----------
+        data : object
+
+        Returns
+        -------
+        handle
+
+        """
+        return data
+
     def get_result(self, task_id):
         """Return the result from task identified by `task_id` when it arrives.
 
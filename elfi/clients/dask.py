@@ -1,7 +1,9 @@
-"""This module implements a multiprocessing client using dask."""
+"""This module implements a multiprocessing client using dask.
+
+https://distributed.dask.org
+"""
 
 import itertools
-import os
 
 from dask.distributed import Client as DaskClient
 
@@ -15,11 +17,27 @@ def set_as_default():
 
 
 class Client(elfi.client.ClientBase):
-    """A multiprocessing client using dask."""
+    """A multiprocessing client using dask.
+
+    The batches are submitted as dask futures and scheduled dynamically by the dask
+    scheduler, so the client can be used with both a local and a distributed cluster.
+
+    https://distributed.dask.org
+    """
 
-    def __init__(self):
-        """Initialize a dask client."""
-        self.dask_client = DaskClient()
+    def __init__(self, dask_client=None, **kwargs):
+        """Initialize a dask client.
+
+        Parameters
+        ----------
+        dask_client : dask.distributed.Client, optional
+            Use this dask client with ELFI, e.g. one connected to a distributed cluster.
+        kwargs
+            Passed to `dask.distributed.Client` if `dask_client` is not given, e.g.
+            `address` of a running scheduler.
+
+        """
+        self.dask_client = dask_client or DaskClient(**kwargs)
         self.tasks = {}
         self._id_counter = itertools.count()
 
@@ -36,6 +54,8 @@ class Client(elfi.client.ClientBase):
 
         """
         task_id = self._id_counter.__next__()
+        # Tasks are not pure as they may depend on e.g. the random state of the worker
+        kwargs.setdefault('pure', False)
         async_result = self.dask_client.submit(kallable, *args, **kwargs)
         self.tasks[task_id] = async_result
         return task_id
@@ -50,6 +70,22 @@ class Client(elfi.client.ClientBase):
         """
         return self.dask_client.run_on_scheduler(kallable, *args, **kwargs)
 
+    def scatter(self, data):
+        """Broadcast `data` to all workers and return a future to it.
+
+        Parameters
+        ----------
+        data: object
+
+        Returns
+        -------
+        distributed.Future
+
+        """
+        # Without hashing, scattering equal data again does not reuse the key of a future that
+        # is being released, which would cancel the tasks depending on it
+        return self.dask_client.scatter(data, broadcast=True, hash=False)
+
     def get_result(self, task_id):
         """Return the result from task identified by `task_id` when it arrives.
 
@@ -98,14 +134,14 @@ class Client(elfi.client.ClientBase):
 
     @property
     def num_cores(self):
-        """Return the number of processes.
+        """Return the number of worker threads in the cluster.
 
         Returns
         -------
         int
 
         """
-        return os.cpu_count()
+        return sum(self.dask_client.nthreads().values())
 
 
 set_as_default()
@@ -154,25 +154,29 @@ class RandomStateLoader(Loader):  # noqa: D101
             can depend on the batch_index.
 
         """
-        key = 'output'
         seed = context.seed
+        if seed != 'global' and not isinstance(seed, (int, np.int32, np.uint32)):
+            raise ValueError("Seed of type {} is not supported".format(seed))
+
+        # Nothing to load, so skip generating the sub seed and random state
+        node_name = '_random_state'
+        if not compiled_net.has_node(node_name):
+            return compiled_net
+
+        key = 'output'
 
         if seed == 'global':
             # Get the random_state of the respective worker by delaying the evaluation
             random_state = get_np_random
             key = 'operation'
-        elif isinstance(seed, (int, np.int32, np.uint32)):
+        else:
             # TODO: In the future, we could use https://pypi.python.org/pypi/randomstate to enable
             # jumps?
             cache = context.caches.get('sub_seed', None)
             sub_seed = get_sub_seed(seed, batch_index, cache=cache)
             random_state = np.random.RandomState(sub_seed)
-        else:
-            raise ValueError("Seed of type {} is not supported".format(seed))
 
         # Assign the random state or its acquirer function to the corresponding node
-        node_name = '_random_state'
-        if compiled_net.has_node(node_name):
-            compiled_net.nodes[node_name][key] = random_state
+        compiled_net.nodes[node_name][key] = random_state
 
         return compiled_net
@@ -95,6 +95,24 @@ class AcquisitionBase:
         """
         raise NotImplementedError
 
+    def evaluate_with_gradient(self, x, t=None):
+        """Evaluate the acquisition function and its gradient at 'x'.
+
+        Subclasses may override this to share the model predictions between the two.
+
+        Parameters
+        ----------
+        x : numpy.array
+        t : int
+            Current iteration (starting from 0).
+
+        Returns
+        -------
+        tuple of the value and the gradient of the acquisition function
+
+        """
+        return self.evaluate(x, t), self.evaluate_gradient(x, t)
+
     def acquire(self, n, t=None):
         """Return the next batch of acquisition points.
 
@@ -117,17 +135,14 @@ class AcquisitionBase:
 
         # Optimize the current minimum
         def obj(x):
-            return self.evaluate(x, t)
-
-        def grad_obj(x):
-            return self.evaluate_gradient(x, t)
+            return self.evaluate_with_gradient(x, t)
 
         xhat, _ = minimize(
             obj,
             self.model.bounds,
             method='L-BFGS-B' if self.constraints is None else 'SLSQP',
             constraints=self.constraints,
-            grad=grad_obj,
+            grad=True,
             prior=self.prior,
             n_start_points=self.n_inits,
             maxiter=self.max_opt_iters,
@@ -254,6 +269,31 @@ class LCBSC(AcquisitionBase):
 
         return grad_mean - 0.5 * grad_var * np.sqrt(self._beta(t) / var)
 
+    def evaluate_with_gradient(self, x, t=None):
+        """Evaluate the lower confidence bound selection criterion and its gradient.
+
+        The GP posterior at `x` is predicted only once for both. Subclasses overriding
+        `evaluate` or `evaluate_gradient` get them evaluated separately instead.
+
+        Parameters
+        ----------
+        x : numpy.array
+        t : int
+            Current iteration (starting from 0).
+
+        """
+        if (type(self).evaluate is not LCBSC.evaluate
+                or type(self).evaluate_gradient is not LCBSC.evaluate_gradient):
+            return super(LCBSC, self).evaluate_with_gradient(x, t)
+
+        mean, var = self.model.predict(x, noiseless=True)
+        grad_mean, grad_var = self.model.predictive_gradients(x)
+        beta = self._beta(t)
+
+        value = mean - np.sqrt(beta * var)
+        gradient = grad_mean - 0.5 * grad_var * np.sqrt(beta / var)
+        return value, gradient
+
 
 class MaxVar(AcquisitionBase):
     r"""The maximum variance acquisition method.
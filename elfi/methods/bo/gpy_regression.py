@@ -7,6 +7,7 @@ import logging
 
 import GPy
 import numpy as np
+import scipy.linalg as sl
 
 logger = logging.getLogger(__name__)
 logging.getLogger("GP").setLevel(logging.WARNING)  # GPy library logger
@@ -132,8 +133,9 @@ class GPyRegression:
             kx = self._rbf_var * np.exp(r2 * self._rbf_factor) + self._rbf_bias
             mu = kx.dot(self._rbf_woodbury)
 
+            # only the diagonal of the predictive covariance is needed
             var = self._rbf_var + self._rbf_bias
-            var -= kx.dot(self._rbf_woodbury_inv.dot(kx.T))
+            var -= np.sum(kx.dot(self._rbf_woodbury_inv) * kx, axis=1, keepdims=True)
             var += self._rbf_noisevar  # likelihood
 
             return mu, var
@@ -212,8 +214,9 @@ class GPyRegression:
             dkdx = 2. * self._rbf_factor * (x - self._gp.X) * kx.T
             grad_mu = dkdx.T.dot(self._rbf_woodbury).T
 
-            v = np.linalg.solve(self._rbf_woodbury_chol, kx.T + self._rbf_bias)
-            dvdx = np.linalg.solve(self._rbf_woodbury_chol, dkdx)
+            # the cached Cholesky factor is lower triangular, so O(n^2) solves suffice
+            v = sl.solve_triangular(self._rbf_woodbury_chol, kx.T + self._rbf_bias, lower=True)
+            dvdx = sl.solve_triangular(self._rbf_woodbury_chol, dkdx, lower=True)
             grad_var = -2. * dvdx.T.dot(v).T
         else:
             grad_mu, grad_var = self._gp.predictive_gradients(x)
@@ -309,6 +312,7 @@ class GPyRegression:
             mean_function = self._gp.mean_function.copy() if self._gp.mean_function else None
             self._gp = self._make_gpy_instance(
                 x, y, kernel=kernel, noise_var=noise_var, mean_function=mean_function)
+        self._rbf_is_cached = False
 
         if optimize:
             self.optimize()
@@ -320,6 +324,7 @@ class GPyRegression:
             self._gp.optimize(self.optimizer, max_iters=self.max_opt_iters)
         except np.linalg.linalg.LinAlgError:
             logger.warning("Numerical error in GP optimization. Stopping optimization")
+        self._rbf_is_cached = False
 
     @property
     def n_evidence(self):
@@ -58,8 +58,9 @@ def minimize(fun,
         Minimizer method to use, defaults to L-BFGS-B.
     constraints : {Constraint, dict} or List of {Constraint, dict}, optional
         Constraints definition (only for COBLYA, SLSQP and trust-constr).
-    grad : callable
-        Gradient of fun or None.
+    grad : callable or bool
+        Gradient of fun or None. If True, fun is assumed to return both the value and
+        the gradient.
     prior : scipy-like distribution object
         Used for sampling initialization points. If None, samples uniformly.
     n_start_points : int, optional
@@ -2,6 +2,7 @@
 
 __all__ = ['BayesianOptimization', 'BOLFI']
 
+import copy
 import logging
 
 import matplotlib.pyplot as plt
@@ -39,6 +40,7 @@ class BayesianOptimization(ParameterInference):
                  batch_size=1,
                  batches_per_acquisition=None,
                  async_acq=False,
+                 n_optimization_restarts=1,
                  **kwargs):
         """Initialize Bayesian optimization.
 
@@ -68,6 +70,8 @@ class BayesianOptimization(ParameterInference):
             Elfi batch size. Defaults to 1.
         batches_per_acquisition : int, optional
             How many batches will be requested from the acquisition function at one go.
+            The acquired points are queued and consumed by the following batches, so the
+            cost of optimizing the acquisition function is shared between them.
             Defaults to max_parallel_batches.
         async_acq : bool, optional
             Allow acquisitions to be made asynchronously, i.e. do not wait for all the
@@ -75,6 +79,10 @@ class BayesianOptimization(ParameterInference):
             efficient with a large amount of workers (e.g. in cluster environments) but
             forgoes the guarantee for the exactly same result with the same initial
             conditions (e.g. the seed). Default False.
+        n_optimization_restarts : int, optional
+            Number of independent runs of the stochastic optimization used for finding the
+            minimum of the target model in `extract_result`. The runs are computed in
+            parallel in the client and the best result is returned. Default 1.
         **kwargs
 
         """
@@ -98,9 +106,9 @@ class BayesianOptimization(ParameterInference):
             self.target_model.update(params, precomputed[target_name])
 
         self.batches_per_acquisition = batches_per_acquisition or self.max_parallel_batches
+        self._prior = ModelPrior(self.model)
         self.acquisition_method = acquisition_method or LCBSC(self.target_model,
-                                                              prior=ModelPrior(
-                                                                  self.model),
+                                                              prior=self._prior,
                                                               noise_var=acq_noise_var,
                                                               exploration_rate=exploration_rate,
                                                               seed=self.seed)
@@ -109,11 +117,15 @@ class BayesianOptimization(ParameterInference):
         self.n_precomputed_evidence = n_precomputed
         self.update_interval = update_interval
         self.async_acq = async_acq
+        self.n_optimization_restarts = n_optimization_restarts
 
         self.state['n_evidence'] = self.n_precomputed_evidence
         self.state['last_GP_update'] = self.n_initial_evidence
         self.state['acquisition'] = []
 
+        # (GP state, threshold) of the latest default posterior threshold
+        self._default_threshold = None
+
     def _resolve_initial_evidence(self, initial_evidence):
         # Some sensibility limit for starting GP regression
         precomputed = None
@@ -184,8 +196,7 @@ class BayesianOptimization(ParameterInference):
         OptimizationResult
 
         """
-        x_min, _ = stochastic_optimization(
-            self.target_model.predict_mean, self.target_model.bounds, seed=self.seed)
+        x_min, _ = self._minimize_target_mean()
 
         batch_min = arr2d_to_batch(x_min, self.parameter_names)
         outputs = arr2d_to_batch(self.target_model.X, self.parameter_names)
@@ -194,6 +205,24 @@ class BayesianOptimization(ParameterInference):
         return OptimizationResult(
             x_min=batch_min, outputs=outputs, **self._extract_result_kwargs())
 
+    def _minimize_target_mean(self):
+        """Find the minimum of the mean of the target model.
+
+        The first run uses the inference seed, so that a single run gives the same result as
+        before. Additional runs use sub seeds of it and are submitted to the client in
+        parallel.
+        """
+        if self.n_optimization_restarts <= 1:
+            return stochastic_optimization(
+                self.target_model.predict_mean, self.target_model.bounds, seed=self.seed)
+
+        seeds = [self.seed] + [get_sub_seed(self.seed, i)
+                               for i in range(1, self.n_optimization_restarts)]
+        task_ids = [self.client.apply(stochastic_optimization, self.target_model.predict_mean,
+                                      self.target_model.bounds, seed=seed) for seed in seeds]
+        results = [self.client.get_result(task_id) for task_id in task_ids]
+        return min(results, key=lambda result: result[1])
+
     def update(self, batch, batch_index):
         """Update the GP regression model of the target node with a new batch.
 
@@ -276,11 +305,7 @@ class BayesianOptimization(ParameterInference):
 
         # Do not allow acquisition until previous acquisitions are ready (as well
         # as all initial acquisitions)
-        acquisitions_left = len(self.state['acquisition'])
-        if acquisitions_left == 0 and self.batches.has_pending:
-            return False
-
-        return True
+        return len(self.state['acquisition']) > 0 or not self.batches.has_pending
 
     def _should_optimize(self):
         current = self.target_model.n_evidence + self.batch_size
@@ -288,6 +313,9 @@ class BayesianOptimization(ParameterInference):
         return current >= self.n_initial_evidence and current >= next_update
 
     def _report_batch(self, batch_index, params, distances):
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+
         str = "Received batch {}:\n".format(batch_index)
         fill = 6 * ' '
         for i in range(self.batch_size):
@@ -449,7 +477,33 @@ class BOLFI(BayesianOptimization):
             raise ValueError(
                 'Model is not fitted yet, please see the `fit` method.')
 
-        return BolfiPosterior(self.target_model, threshold=threshold, prior=ModelPrior(self.model))
+        # The default threshold requires optimizing the GP mean, so reuse it until the GP
+        # changes
+        use_default = threshold is None
+        if use_default:
+            gp_state = self._gp_state()
+            if self._default_threshold is not None \
+                    and self._is_same_gp_state(self._default_threshold[0], gp_state):
+                threshold = self._default_threshold[1]
+
+        posterior = BolfiPosterior(self.target_model, threshold=threshold, prior=self._prior)
+        if use_default:
+            self._default_threshold = (gp_state, posterior.threshold)
+        return posterior
+
+    def _gp_state(self):
+        """Return the target model, its GP instance and a copy of the GP hyperparameters.
+
+        New evidence replaces the GP instance, so only the few hyperparameters are copied.
+
+        """
+        gp = self.target_model.instance
+        return (self.target_model, gp, gp.param_array.copy())
+
+    @staticmethod
+    def _is_same_gp_state(state1, state2):
+        return (state1[0] is state2[0] and state1[1] is state2[1] and
+                np.array_equal(state1[2], state2[2]))
 
     def sample(self,
                n_samples,
@@ -460,6 +514,7 @@ class BOLFI(BayesianOptimization):
                algorithm='nuts',
                sigma_proposals=None,
                n_evidence=None,
+               inv_mass=None,
                **kwargs):
         r"""Sample the posterior distribution of BOLFI.
 
@@ -473,6 +528,10 @@ class BOLFI(BayesianOptimization):
 
         The sampling is performed with an MCMC sampler (the No-U-Turn Sampler, NUTS).
 
+        The chains are submitted as separate tasks to the client of the inference, so they
+        are sampled in parallel when a parallel client is in use (see e.g.
+        `elfi.set_client('multiprocessing')`) and sequentially with the native client.
+
         Parameters
         ----------
         n_samples : int
@@ -494,6 +553,11 @@ class BOLFI(BayesianOptimization):
             Markov Chain sampler.
         n_evidence : int
             If the regression model is not fitted yet, specify the amount of evidence
+        inv_mass : np.array or str, optional
+            Inverse mass matrix for NUTS, see `elfi.methods.mcmc.nuts`. If 'hessian', it is
+            estimated from the curvature of the posterior at the best initialization point,
+            which usually speeds up the adaptation of correlated or differently scaled
+            parameters.
 
         Returns
         -------
@@ -506,6 +570,8 @@ class BOLFI(BayesianOptimization):
         # TODO: add more MCMC algorithms
         if algorithm not in ['nuts', 'metropolis']:
             raise ValueError("Unknown posterior sampler.")
+        if inv_mass is not None and algorithm != 'nuts':
+            raise ValueError("inv_mass can only be used with the 'nuts' algorithm.")
 
         posterior = self.extract_posterior(threshold)
         warmup = warmup or n_samples // 2
@@ -515,14 +581,27 @@ class BOLFI(BayesianOptimization):
             if np.asarray(initials).shape != (n_chains, self.target_model.input_dim):
                 raise ValueError(
                     "The shape of initials must be (n_chains, n_params).")
+            # discard bad initialization points
+            initials = np.asarray(initials)
+            initials = initials[np.isfinite(posterior.logpdf(initials))]
         else:
-            inds = np.argsort(self.target_model.Y[:, 0])
-            initials = np.asarray(self.target_model.X[inds])
+            initials = self._best_evidence_points(posterior, n_chains)
+
+        if len(initials) < n_chains:
+            raise ValueError(
+                "BOLFI.sample: Cannot find enough acceptable initialization points!")
+
+        if isinstance(inv_mass, str):
+            if inv_mass != 'hessian':
+                raise ValueError("Unknown inv_mass {}.".format(inv_mass))
+            inv_mass = self._estimate_inv_mass(posterior, initials[0])
 
         self.target_model.is_sampling = True  # enables caching for default RBF kernel
+        if self.target_model._kernel_is_default and not self.target_model._rbf_is_cached:
+            # fill the cache before the GP is shared, so that the chains only read it
+            self.target_model._cache_RBF_kernel()
 
         tasks_ids = []
-        ii_initial = 0
         if algorithm == 'metropolis':
             if sigma_proposals is None:
                 raise ValueError("Gaussian proposal standard deviations "
@@ -531,54 +610,44 @@ class BOLFI(BayesianOptimization):
                 raise ValueError("The length of Gaussian proposal standard "
                                  "deviations must be n_params.")
 
+        if algorithm == 'nuts':
+            sampler_kwargs = dict(n_adapt=warmup, inv_mass=inv_mass)
+        else:
+            sampler_kwargs = dict(sigma_proposals=sigma_proposals, warmup=warmup)
+        sampler_kwargs.update(kwargs)
+
+        # the posterior (including the GP) is shared by all chains, so send it only once
+        posterior_handle = self.client.scatter(posterior)
+        # only the cached predictions of the default kernel are safe to share between threads
+        copy_posterior = not self.target_model._kernel_is_default
+        seed_cache = {}
+
         # sampling is embarrassingly parallel, so depending on self.client this may parallelize
         for ii in range(n_chains):
-            seed = get_sub_seed(self.seed, ii)
-            # discard bad initialization points
-            while np.isinf(posterior.logpdf(initials[ii_initial])):
-                ii_initial += 1
-                if ii_initial == len(inds):
-                    raise ValueError(
-                        "BOLFI.sample: Cannot find enough acceptable initialization points!")
-
-            if algorithm == 'nuts':
-                tasks_ids.append(
-                    self.client.apply(
-                        mcmc.nuts,
-                        n_samples,
-                        initials[ii_initial],
-                        posterior.logpdf,
-                        posterior.gradient_logpdf,
-                        n_adapt=warmup,
-                        seed=seed,
-                        **kwargs))
-
-            elif algorithm == 'metropolis':
-                tasks_ids.append(
-                    self.client.apply(
-                        mcmc.metropolis,
-                        n_samples,
-                        initials[ii_initial],
-                        posterior.logpdf,
-                        sigma_proposals,
-                        warmup,
-                        seed=seed,
-                        **kwargs))
-
-            ii_initial += 1
+            seed = get_sub_seed(self.seed, ii, cache=seed_cache)
+            tasks_ids.append(
+                self.client.apply(
+                    _sample_chain,
+                    algorithm,
+                    posterior_handle,
+                    n_samples,
+                    initials[ii],
+                    copy_posterior=copy_posterior,
+                    seed=seed,
+                    **sampler_kwargs))
 
         # get results from completed tasks or run sampling (client-specific)
-        chains = []
-        for id in tasks_ids:
-            chains.append(self.client.get_result(id))
+        chains = np.empty((n_chains, n_samples, self.target_model.input_dim))
+        for ii, task_id in enumerate(tasks_ids):
+            chains[ii] = self.client.get_result(task_id)
 
-        chains = np.asarray(chains)
         print(
             "{} chains of {} iterations acquired. Effective sample size and Rhat for each "
             "parameter:".format(n_chains, n_samples))
-        for ii, node in enumerate(self.parameter_names):
-            print(node, mcmc.eff_sample_size(chains[:, :, ii]),
-                  mcmc.gelman_rubin_statistic(chains[:, :, ii]))
+        ess = mcmc.eff_sample_size(chains)
+        rhat = mcmc.gelman_rubin_statistic(chains)
+        for node, ess_node, rhat_node in zip(self.parameter_names, ess, rhat):
+            print(node, ess_node, rhat_node)
         self.target_model.is_sampling = False
 
         return BolfiSample(
@@ -589,3 +658,68 @@ class BOLFI(BayesianOptimization):
             threshold=float(posterior.threshold),
             n_sim=self.state['n_evidence'],
             seed=self.seed)
+
+    def _best_evidence_points(self, posterior, n_points):
+        """Return acceptable evidence points in the order of increasing discrepancy.
+
+        Only the best candidates are sorted, and more are considered only if some of them have
+        zero posterior density.
+
+        """
+        discrepancies = self.target_model.Y[:, 0]
+        n_candidates = min(n_points, len(discrepancies))
+        while True:
+            inds = np.argpartition(discrepancies, n_candidates - 1)[:n_candidates]
+            inds = inds[np.argsort(discrepancies[inds])]
+            points = self.target_model.X[inds]
+            points = points[np.isfinite(posterior.logpdf(points))]
+            if len(points) >= n_points or n_candidates == len(discrepancies):
+                return points
+            n_candidates = min(2 * n_candidates, len(discrepancies))
+
+    def _estimate_inv_mass(self, posterior, x):
+        """Estimate the posterior covariance at `x` from the Hessian of the log posterior.
+
+        The Hessian is approximated with central differences of the gradient. Directions in
+        which the log posterior is flat or convex are given the variance of a uniform
+        distribution over the widest bound.
+
+        """
+        bounds = np.asarray(self.target_model.bounds, dtype=float)
+        widths = bounds[:, 1] - bounds[:, 0]
+        steps = 1e-4 * widths
+
+        hessian = np.empty((len(x), len(x)))
+        for i, step in enumerate(steps):
+            dx = np.zeros(len(x))
+            dx[i] = step
+            hessian[i] = np.ravel(posterior.gradient_logpdf(x + dx) -
+                                  posterior.gradient_logpdf(x - dx)) / (2 * step)
+        hessian = 0.5 * (hessian + hessian.T)
+
+        eigvals, eigvecs = np.linalg.eigh(-hessian)
+        max_var = np.max(widths)**2 / 12.
+        variances = 1. / np.maximum(eigvals, 1. / max_var)
+        return (eigvecs * variances).dot(eigvecs.T)
+
+
+def _sample_chain(algorithm, posterior, n_samples, initial, copy_posterior=False, **kwargs):
+    """Sample one MCMC chain from the BOLFI posterior.
+
+    The posterior is passed as such rather than its bound methods, so that clients can
+    distribute it in advance with `scatter`. Chains running in the same worker may then
+    receive the same object. With the default kernel it need not be copied: the cached GP
+    predictions are only read and the prior serializes its evaluations. Other kernels use
+    the GPy predictions, whose caches are not thread-safe, so `copy_posterior` should then
+    be set to give the chain its own copy.
+
+    """
+    if copy_posterior:
+        # The kernel given by the user stays in gp_params, which is only read when a new GP
+        # is built. Its parameters are linked to the GP, so it is shared rather than copied.
+        gp_params = posterior.model.gp_params
+        posterior = copy.deepcopy(posterior, {id(gp_params): gp_params})
+    if algorithm == 'nuts':
+        return mcmc.nuts(n_samples, initial, posterior.logpdf, posterior.gradient_logpdf,
+                         **kwargs)
+    return mcmc.metropolis(n_samples, initial, posterior.logpdf, **kwargs)
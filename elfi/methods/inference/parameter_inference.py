@@ -192,7 +192,9 @@ class ParameterInference:
         -------
         batch : dict or None
             Keys should match to node names in the model. These values will override any
-            default values or operations in those nodes.
+            default values or operations in those nodes. The values are not copied on
+            submission, so a new array (or view of a new array) should be returned for each
+            batch.
 
         """
         pass
@@ -280,12 +282,12 @@ class ParameterInference:
         # Submit new batches if allowed
         while self._allow_submit(self.batches.next_index):
             next_batch = self.prepare_new_batch(self.batches.next_index)
-            logger.debug("Submitting batch %d" % self.batches.next_index)
+            logger.debug("Submitting batch %d", self.batches.next_index)
             self.batches.submit(next_batch)
 
         # Handle the next ready batch in succession
         batch, batch_index = self.batches.wait_next()
-        logger.debug('Received batch %d' % batch_index)
+        logger.debug('Received batch %d', batch_index)
         self.update(batch, batch_index)
 
     @property
@@ -294,12 +296,14 @@ class ParameterInference:
         return self._objective_n_batches <= self.state['n_batches']
 
     def _allow_submit(self, batch_index):
-        return (self.max_parallel_batches > self.batches.num_pending
-                and self._has_batches_to_submit and (not self.batches.has_ready()))
-
-    @property
-    def _has_batches_to_submit(self):
-        return self._objective_n_batches > self.state['n_batches'] + self.batches.num_pending
+        # This is polled repeatedly in `iterate`, so read the counters only once and
+        # check the cheapest conditions first
+        num_pending = self.batches.num_pending
+        if self.max_parallel_batches <= num_pending:
+            return False
+        if self._objective_n_batches <= self.state['n_batches'] + num_pending:
+            return False
+        return not self.batches.has_ready()
 
     @property
     def _objective_n_batches(self):
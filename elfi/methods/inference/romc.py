@@ -12,6 +12,7 @@ import numpy as np
 import scipy.optimize as optim
 import scipy.spatial as spatial
 import scipy.stats as ss
+from scipy.special import xlogy
 from sklearn.linear_model import LinearRegression
 from sklearn.pipeline import Pipeline
 from sklearn.preprocessing import PolynomialFeatures
@@ -26,7 +27,9 @@ from elfi.methods.posteriors import RomcPosterior
 from elfi.methods.results import OptimizationResult, RomcSample
 from elfi.methods.utils import (NDimBoundingBox, arr2d_to_batch, batch_to_arr2d,
                                 ceil_to_batch_size, compute_ess, flat_array_to_dict)
+from elfi.model.elfi_model import ComputationContext
 from elfi.model.extensions import ModelPrior
+from elfi.store import OutputPool
 from elfi.visualization.visualization import ProgressBar
 
 logger = logging.getLogger(__name__)
@@ -498,6 +501,10 @@ class ROMC(ParameterInference):
 
         super(ROMC, self).__init__(model, output_names, **kwargs)
 
+        # The deterministic generators evaluate the same net, so it is compiled only once
+        self._det_net = self.client.compile(self.model.source_net, [self.discrepancy_name])
+        self._det_executor_cache = {}
+
     def _sample_nuisance(self, n1, seed=None):
         """Draw n1 nuisance variables (i.e. seeds).
 
@@ -561,16 +568,18 @@ class ROMC(ParameterInference):
 
     def _det_generator(self, theta, seed):
         model = self.model
-        dim = self.dim
         output_node = self.discrepancy_name
 
-        assert theta.ndim == 1
-        assert theta.shape[0] == dim
-
         # Map flattened array of parameters to parameter names with correct shape
         param_dict = flat_array_to_dict(model.parameter_names, theta)
-        dict_outputs = model.generate(
-            batch_size=1, outputs=[output_node], with_values=param_dict, seed=int(seed))
+
+        # As in model.generate, but with the precompiled net
+        pool = OutputPool(param_dict.keys())
+        pool.add_batch(param_dict, 0)
+        context = ComputationContext(1, seed=seed, pool=pool)
+        context.caches['executor'] = self._det_executor_cache
+        loaded_net = self.client.load_data(self._det_net, context, batch_index=0)
+        dict_outputs = self.client.compute(loaded_net)
         return float(dict_outputs[output_node]) ** 2
 
     def _freeze_seed(self, seed):
@@ -587,7 +596,7 @@ class ROMC(ParameterInference):
             the deterministic generator
 
         """
-        return partial(self._det_generator, seed=seed)
+        return partial(self._det_generator, seed=int(seed))
 
     def _worker_solve_gradients(self, args):
         optim_prob, kwargs = args
@@ -765,6 +774,8 @@ class ROMC(ParameterInference):
         optimisation method (gradients or bo)
         * step, the step size along the search direction, default 0.05
         * lim, max translation along the search direction, default 100
+        * monotone, whether to search the limits assuming a monotone objective along the
+        search direction, default False
 
         """
         # getters
@@ -857,18 +868,18 @@ class ROMC(ParameterInference):
         nuisance = []
         for i, prob in enumerate(problems):
             if prob.state["region"]:
-                for jj in range(len(prob.regions)):
-                    nuisance.append(prob.nuisance)
-                    regions.append(prob.regions[jj])
-                    if not use_local:
-                        if use_surrogate:
-                            assert prob.surrogate is not None
-                            funcs.append(prob.surrogate)
-                        else:
-                            funcs.append(prob.objective)
+                nof_regions = len(prob.regions)
+                nuisance.extend([prob.nuisance] * nof_regions)
+                regions.extend(prob.regions)
+                if not use_local:
+                    if use_surrogate:
+                        assert prob.surrogate is not None
+                        funcs.extend([prob.surrogate] * nof_regions)
                     else:
-                        assert prob.local_surrogate is not None
-                        funcs.append(prob.local_surrogate[jj])
+                        funcs.extend([prob.objective] * nof_regions)
+                else:
+                    assert prob.local_surrogate is not None
+                    funcs.extend(prob.local_surrogate[:nof_regions])
 
                 if not use_local:
                     if use_surrogate:
@@ -994,7 +1005,8 @@ class ROMC(ParameterInference):
         region_args: Union[None, Dict]
             keyword-arguments that will be passed to the regionConstructor.
             The arguments "eps_region" and "use_surrogate" are automatically appended,
-            if not defined explicitly.
+            if not defined explicitly. Passing "monotone": True speeds up the search of the
+            box limits for objectives that increase along the search directions.
         fit_models: bool
             whether to fit a helping model around the optimal point
         fit_models_args: Union[None, Dict]
@@ -1154,9 +1166,13 @@ class ROMC(ParameterInference):
         assert self.inference_state["_has_drawn_samples"]
         return compute_ess(self.result.weights)
 
-    def compute_divergence(self, gt_posterior, bounds=None, step=0.1, distance="Jensen-Shannon"):
+    def compute_divergence(self, gt_posterior, bounds=None, step=0.1, distance="Jensen-Shannon",
+                           gt_sampler=None, n_mc=10000, seed=None):
         """Compute divergence between ROMC posterior and ground-truth.
 
+        For D <= 2 the divergence is computed on a grid. For D > 2 it is estimated with
+        importance sampling from the ground-truth posterior, if `gt_sampler` is given.
+
         Parameters
         ----------
         gt_posterior: Callable,
@@ -1167,6 +1183,14 @@ class ROMC(ParameterInference):
         step: float
         distance: str
             which distance to use. must be in ["Jensen-Shannon", "KL-Divergence"]
+        gt_sampler: Callable (optional)
+            draws samples from the ground-truth posterior,
+            gt_sampler(n, random_state) -> np.ndarray (n,D), e.g. the rvs method of a frozen
+            scipy distribution. Used only for D > 2.
+        n_mc: int
+            number of samples for the importance sampling estimate
+        seed: int (optional)
+            seed for the random state passed to gt_sampler
 
         Returns
         -------
@@ -1214,14 +1238,20 @@ class ROMC(ParameterInference):
             nof_points = int((right - left) / step)
             y = np.linspace(left, right, nof_points)
 
-            x, y = np.meshgrid(x, y)
-            inp = np.stack((x.flatten(), y.flatten()), -1)
+            # Fill the grid points directly, in the order of a flattened meshgrid
+            inp = np.empty((len(y), len(x), 2))
+            inp[:, :, 0] = x
+            inp[:, :, 1] = y[:, None]
+            inp = inp.reshape((-1, 2))
 
             p_points = np.squeeze(p(inp))
             q_points = np.squeeze(q(inp))
-        else:
-            logger.info("Computational approximation of KL Divergence on D > 2 is intractable.")
+        elif gt_sampler is None:
+            logger.info("Computational approximation of KL Divergence on D > 2 is intractable "
+                        "without samples from the ground-truth posterior.")
             return None
+        else:
+            return self._estimate_divergence(q, gt_sampler, n_mc, distance, seed)
 
         # compute distance
         if distance == "KL-Divergence":
@@ -1229,6 +1259,31 @@ class ROMC(ParameterInference):
         elif distance == "Jensen-Shannon":
             return spatial.distance.jensenshannon(p_points, q_points)
 
+    def _estimate_divergence(self, gt_posterior, gt_sampler, n_mc, distance, seed=None):
+        """Estimate the divergence with importance sampling from the ground-truth posterior.
+
+        The ROMC posterior cannot be normalized for D > 2, so its normalizing constant is
+        estimated from the same samples, i.e. with self-normalized importance weights.
+
+        """
+        theta = gt_sampler(n_mc, np.random.RandomState(seed))
+        theta = theta.reshape((n_mc, -1))
+        p_points = np.squeeze(self.posterior.pdf_unnorm_batched(theta))
+        q_points = np.squeeze(gt_posterior(theta))
+
+        # density ratio p/q, normalized to have mean 1 under q
+        ratio = p_points / q_points
+        ratio /= np.mean(ratio)
+
+        if distance == "KL-Divergence":
+            return np.mean(xlogy(ratio, ratio))
+        elif distance == "Jensen-Shannon":
+            # KL(p||m) and KL(q||m) for the mixture m = (p + q) / 2
+            mixture = (ratio + 1) / 2
+            kl_p = np.mean(xlogy(ratio, ratio) - xlogy(ratio, mixture))
+            kl_q = -np.mean(np.log(mixture))
+            return np.sqrt((kl_p + kl_q) / 2)
+
     def extract_result(self):
         """Extract the result from the current state.
 
@@ -1482,6 +1537,7 @@ class OptimisationProblem:
         func = self.surrogate if use_surrogate else self.objective
         step = 0.05 if "step" not in kwargs else kwargs["step"]
         lim = 100 if "lim" not in kwargs else kwargs["lim"]
+        monotone = False if "monotone" not in kwargs else kwargs["monotone"]
         assert "eps_region" in kwargs, \
             "In the current build region implementation, kwargs must contain eps_region"
         eps_region = kwargs["eps_region"]
@@ -1489,7 +1545,8 @@ class OptimisationProblem:
 
         # construct region
         constructor = RegionConstructor(
-            self.result, func, self.dim, eps_region=eps_region, lim=lim, step=step)
+            self.result, func, self.dim, eps_region=eps_region, lim=lim, step=step,
+            monotone=monotone)
         self.regions = constructor.build()
 
         # update the state
@@ -1578,7 +1635,7 @@ class RegionConstructor:
     """Class for constructing an n-dim bounding box region."""
 
     def __init__(self, result: RomcOpimisationResult,
-                 func, dim, eps_region, lim, step):
+                 func, dim, eps_region, lim, step, monotone=False):
         """Class constructor.
 
         Parameters
@@ -1589,6 +1646,10 @@ class RegionConstructor:
         eps_region: threshold
         lim: float, largets translation along the search direction
         step: float, step along the search direction
+        monotone: bool, whether func can be assumed to increase along the search directions.
+            If True, the limits are searched by doubling the step and bisecting, which needs
+            O(log(lim / step)) evaluations of func but may skip a region where a
+            non-monotone func exceeds eps_region. By default, all the steps are scanned.
 
         """
         self.res = result
@@ -1597,6 +1658,7 @@ class RegionConstructor:
         self.eps_region = eps_region
         self.lim = lim
         self.step = step
+        self.monotone = monotone
 
     def build(self):
         """Build the bounding box.
@@ -1626,71 +1688,98 @@ class RegionConstructor:
         else:
             h = 1e-5
             grad_vec = optim.approx_fprime(theta_0, func, h)
-            grad_vec = np.expand_dims(grad_vec, -1)
-            hess_appr = np.dot(grad_vec, grad_vec.T)
-            if np.isnan(np.sum(hess_appr)) or np.isinf(np.sum(hess_appr)):
-                hess_appr = np.eye(dim)
+            hess_appr = np.outer(grad_vec, grad_vec)
 
         assert hess_appr.shape[0] == dim
         assert hess_appr.shape[1] == dim
 
-        if np.isnan(np.sum(hess_appr)) or np.isinf(np.sum(hess_appr)):
+        if not np.all(np.isfinite(hess_appr)):
             logger.info("Eye matrix return as rotation.")
             hess_appr = np.eye(dim)
 
-        eig_val, eig_vec = np.linalg.eig(hess_appr)
+        # The Hessian approximation is symmetric, so the eigenvectors are real and orthonormal
+        eig_val, eig_vec = np.linalg.eigh(hess_appr)
 
         # if extreme values appear, return the I matrix
-        if np.isnan(np.sum(eig_vec)) or np.isinf(np.sum(eig_vec)) or (eig_vec.dtype == np.complex):
+        if not np.all(np.isfinite(eig_vec)):
             logger.info("Eye matrix return as rotation.")
             eig_vec = np.eye(dim)
-        if np.linalg.matrix_rank(eig_vec) < dim:
-            eig_vec = np.eye(dim)
 
         rotation = eig_vec
 
         # compute limits
         nof_points = int(lim / step)
+        find_limit = self._find_limit if self.monotone else self._find_limit_linear
 
-        bounding_box = []
+        bounding_box = np.empty((dim, 2))
         for j in range(dim):
-            bounding_box.append([])
             vect = eig_vec[:, j]
 
-            # right side
-            point = theta_0.copy()
-            v_right = 0
-            for i in range(1, nof_points + 1):
-                point += step * vect
-                if func(point) > eps:
-                    v_right = i * step - step / 2
-                    break
-                if i == nof_points:
-                    v_right = (i - 1) * step
-
-            # left side
-            point = theta_0.copy()
-            v_left = 0
-            for i in range(1, nof_points + 1):
-                point -= step * vect
-                if func(point) > eps:
-                    v_left = -i * step + step / 2
-                    break
-                if i == nof_points:
-                    v_left = - (i - 1) * step
+            v_right = find_limit(func, theta_0, vect, eps, step, nof_points)
+            v_left = -find_limit(func, theta_0, -vect, eps, step, nof_points)
 
             if v_left == 0:
                 v_left = -step / 2
             if v_right == 0:
                 v_right = step / 2
 
-            bounding_box[j].append(v_left)
-            bounding_box[j].append(v_right)
-
-        bounding_box = np.array(bounding_box)
-        assert bounding_box.ndim == 2
-        assert bounding_box.shape[0] == dim
-        assert bounding_box.shape[1] == 2
+            bounding_box[j] = v_left, v_right
 
         bb = [NDimBoundingBox(rotation, theta_0, bounding_box, eps)]
         return bb
+
+    @staticmethod
+    def _find_limit(func, theta_0, direction, eps, step, nof_points):
+        """Find how far from theta_0 along direction func stays below eps.
+
+        The step count is first doubled until func exceeds eps and the crossing is then
+        located by bisection, which needs O(log nof_points) evaluations of func. The limit
+        found is never closer to theta_0 than the first crossing on the grid of steps, and
+        equals it if func is monotone along direction.
+
+        Returns
+        -------
+        float
+            The distance of the limit from theta_0, or 0 if there are no steps.
+
+        """
+        if nof_points < 1:
+            return 0.
+
+        def exceeds(i):
+            return func(theta_0 + i * step * direction) > eps
+
+        # theta_0 is a solution below eps, so exceeds(lo) is False and the search ends
+        # with exceeds(hi) True
+        lo, hi = 0, 1
+        while not exceeds(hi):
+            if hi == nof_points:
+                return (nof_points - 1) * step
+            lo, hi = hi, min(2 * hi, nof_points)
+
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if exceeds(mid):
+                hi = mid
+            else:
+                lo = mid
+        return hi * step - step / 2
+
+    @staticmethod
+    def _find_limit_linear(func, theta_0, direction, eps, step, nof_points):
+        """Find the first step from theta_0 along direction where func exceeds eps.
+
+        Returns
+        -------
+        float
+            The distance of the limit from theta_0, or 0 if there are no steps.
+
+        """
+        if nof_points < 1:
+            return 0.
+
+        steps = step * np.arange(1, nof_points + 1)
+        for i, point in enumerate(theta_0 + steps[:, None] * direction):
+            if func(point) > eps:
+                return steps[i] - step / 2
+        return (nof_points - 1) * step
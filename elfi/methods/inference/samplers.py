@@ -68,7 +68,8 @@ class Rejection(Sampler):
 
     """
 
-    def __init__(self, model, discrepancy_name=None, output_names=None, **kwargs):
+    def __init__(self, model, discrepancy_name=None, output_names=None, sample_dtype=None,
+                 **kwargs):
         """Initialize the Rejection sampler.
 
         Parameters
@@ -79,6 +80,10 @@ class Rejection(Sampler):
         output_names : list, optional
             Additional outputs from the model to be included in the inference result, e.g.
             corresponding summaries to the acquired samples
+        sample_dtype : np.dtype, optional
+            Floating point type used for storing the floating point outputs in the sample,
+            e.g. np.float32 to halve the memory usage. Defaults to the dtype of the node
+            outputs. Use only if the outputs fit the precision of the type.
         kwargs:
             See ParameterInference
 
@@ -96,6 +101,7 @@ class Rejection(Sampler):
         super(Rejection, self).__init__(model, output_names, **kwargs)
 
         self.discrepancy_name = discrepancy_name
+        self.sample_dtype = sample_dtype
 
     def set_objective(self, n_samples, threshold=None, quantile=None, n_sim=None):
         """Set objective for inference.
@@ -197,6 +203,8 @@ class Rejection(Sampler):
             shape = (self.objective['n_samples'] +
                      self.batch_size, ) + nbatch.shape[1:]
             dtype = nbatch.dtype
+            if self.sample_dtype is not None and np.issubdtype(dtype, np.floating):
+                dtype = self.sample_dtype
 
             if node == self.discrepancy_name:
                 # Initialize the distances to inf
@@ -217,27 +225,48 @@ class Rejection(Sampler):
 
         # Check acceptance condition
         if self.objective.get('threshold') is None:
-            accepted = slice(None, None)
-            num_accepted = self.batch_size
+            # Only the samples that are better than the current n_samples-th smallest can
+            # end up in the result, so the rest of the batch can be skipped.
+            # note: last (-1) distance measure is used when distance calculation is nested
+            worst = np.atleast_2d(np.transpose(samples[self.discrepancy_name]))[-1]
+            worst = worst[self.objective['n_samples'] - 1]
+            batch_distance = np.atleast_2d(np.transpose(batch[self.discrepancy_name]))[-1]
+            # Written this way so that nan distances are kept in the sample as before
+            accepted = ~(batch_distance >= worst)
+            num_accepted = np.sum(accepted)
         else:
             accepted = batch[self.discrepancy_name] <= self.objective.get('threshold')
             accepted = np.all(np.atleast_2d(np.transpose(accepted)), axis=0)
             num_accepted = np.sum(accepted)
 
+        if num_accepted == 0:
+            return
+
         # Put the acquired samples to the end
-        if num_accepted > 0:
-            for node, v in samples.items():
-                v[-num_accepted:] = batch[node][accepted]
+        for node, v in samples.items():
+            v[-num_accepted:] = batch[node][accepted]
 
-        # Sort the smallest to the beginning
+        # Merge the new samples into the sorted beginning so that the smallest are first.
+        # Only the part of the arrays starting from the first insertion point is reordered.
         # note: last (-1) distance measure is used when distance calculation is nested
         sort_distance = np.atleast_2d(np.transpose(samples[self.discrepancy_name]))[-1]
-        sort_mask = np.argsort(sort_distance)
+        n_old = len(sort_distance) - num_accepted
+        new_order = np.argsort(sort_distance[n_old:], kind='mergesort')
+        insert_at = np.searchsorted(sort_distance[:n_old], sort_distance[n_old:][new_order],
+                                    side='right')
+        start = insert_at[0]
+
+        new_pos = insert_at - start + np.arange(num_accepted)
+        is_old = np.ones(len(sort_distance) - start, dtype=bool)
+        is_old[new_pos] = False
+        sort_mask = np.empty(len(is_old), dtype=np.intp)
+        sort_mask[new_pos] = n_old - start + new_order
+        sort_mask[is_old] = np.arange(n_old - start)
         for k, v in samples.items():
-            v[:] = v[sort_mask]
+            v[start:] = v[start:][sort_mask]
 
     def _update_state_meta(self):
-        """Update `n_sim`, `threshold`, and `accept_rate`."""
+        """Update `threshold` and `accept_rate`."""
         o = self.objective
         s = self.state
         s['threshold'] = s['samples'][self.discrepancy_name][o['n_samples'] - 1]
@@ -252,11 +281,14 @@ class Rejection(Sampler):
         t, n_samples = [self.objective.get(k)
                         for k in ('threshold', 'n_samples')]
 
-        # noinspection PyTypeChecker
-
         if s['samples']:
-            accepted = s['samples'][self.discrepancy_name] <= t
-            n_acceptable = np.sum(np.all(np.atleast_2d(np.transpose(accepted)), axis=0))
+            distances = s['samples'][self.discrepancy_name]
+            if distances.ndim == 1:
+                # The samples are kept sorted by the distance
+                n_acceptable = np.searchsorted(distances, t, side='right')
+            else:
+                accepted = distances <= t
+                n_acceptable = np.sum(np.all(np.atleast_2d(np.transpose(accepted)), axis=0))
         else:
             n_acceptable = 0
 
@@ -273,8 +305,7 @@ class Rejection(Sampler):
             n_batches = ceil(n_batches)
 
         self.objective['n_batches'] = n_batches
-        logger.debug('Estimated objective n_batches=%d' %
-                     self.objective['n_batches'])
+        logger.debug('Estimated objective n_batches=%d', self.objective['n_batches'])
 
     def _update_distances(self):
 
@@ -347,6 +378,7 @@ class SMC(Sampler):
         self._rejection = None
         self._round_random_state = None
         self._quantiles = None
+        self._population_cache = None
 
     def set_objective(self, n_samples, thresholds=None, quantiles=None):
         """Set objective for ABC-SMC inference.
@@ -397,7 +429,7 @@ class SMC(Sampler):
 
         """
         # Extract information from the population
-        pop = self._extract_population()
+        pop = self._get_population()
         self._populations.append(pop)
         return SmcSample(
             outputs=pop.outputs,
@@ -426,7 +458,7 @@ class SMC(Sampler):
                 self.progress_bar.update_progressbar(self.progress_bar.scaling + 1,
                                                      self.progress_bar.scaling + 1)
             if self.state['round'] < self.objective['round']:
-                self._populations.append(self._extract_population())
+                self._populations.append(self._get_population())
                 self.state['round'] += 1
                 self._init_new_round()
         self._update_objective()
@@ -495,6 +527,19 @@ class SMC(Sampler):
         dashes = '-' * 16
         logger.info('%s Starting round %d %s' % (dashes, round, dashes))
 
+    def _get_population(self):
+        """Return the population of the current round.
+
+        The population is extracted only once for each state of the rejection sampler of
+        the round, so that e.g. the final population is not recomputed in `extract_result`
+        when it was already extracted in `update`. The number of batches in the rejection
+        state works as a nonce for the state.
+        """
+        key = (self._rejection, self._rejection.state['n_batches'])
+        if self._population_cache is None or self._population_cache[0] != key:
+            self._population_cache = (key, self._extract_population())
+        return self._population_cache[1]
+
     def _extract_population(self):
         sample = self._rejection.extract_result()
         # Append the sample object
@@ -551,7 +596,9 @@ class SMC(Sampler):
     @property
     def _gm_params(self):
         sample = self._populations[-1]
-        return sample.means, sample.cov, sample.weights
+        # The covariance is diagonal by construction, so pass only the variances to use the
+        # faster diagonal density evaluation of GMDistribution
+        return sample.means, np.diag(sample.cov), sample.weights
 
     @property
     def current_population_threshold(self):
@@ -709,6 +756,7 @@ class AdaptiveThresholdSMC(SMC):
         self._populations = []
         self._rejection = None
         self._round_random_state = None
+        self._population_cache = None
         self.q_threshold = q_threshold
         self.initial_quantile = initial_quantile
 
@@ -775,7 +823,7 @@ class AdaptiveThresholdSMC(SMC):
                 self.progress_bar.update_progressbar(self.progress_bar.scaling + 1,
                                                      self.progress_bar.scaling + 1)
 
-            self._new_population = self._extract_population()
+            self._new_population = self._get_population()
 
             if self.state['round'] < self.objective['round']:
 
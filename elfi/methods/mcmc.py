@@ -21,46 +21,45 @@ def eff_sample_size(chains):
 
     Parameters
     ----------
-    chains : np.array of shape (N,) or (M, N)
-        Samples of a parameter from an MCMC algorithm. No burn-in subtracted here!
+    chains : np.array of shape (N,), (M, N) or (M, N, D)
+        Samples of a parameter from an MCMC algorithm. No burn-in subtracted here! Several
+        parameters can be given along the last axis.
 
     Returns
     -------
-    ess : float
+    ess : float or np.array of shape (D,)
 
     """
-    chains = np.atleast_2d(chains)
-    n_chains, n_samples = chains.shape
+    chains, squeeze = _chains_3d(chains)
+    n_chains, n_samples, n_params = chains.shape
     means = np.mean(chains, axis=1)
     variances = np.var(chains, ddof=1, axis=1)
 
-    var_between = 0 if n_chains == 1 else n_samples * np.var(means, ddof=1)
-    var_within = np.mean(variances)
+    var_between = 0 if n_chains == 1 else n_samples * np.var(means, ddof=1, axis=0)
+    var_within = np.mean(variances, axis=0)
     var_pooled = ((n_samples - 1.) * var_within + var_between) / n_samples
 
-    # autocovariances for lags 1..n_samples
+    # mean autocovariances over the chains for lags 1..n_samples
     # https://en.wikipedia.org/wiki/Autocorrelation#Estimation
+    # (transforming one parameter at a time is faster than one large batch of FFTs)
     n_padded = int(2**np.ceil(1 + np.log2(n_samples)))
-    freqs = np.fft.rfft(chains - means[:, None], n_padded)
-    autocov = np.fft.irfft(np.abs(freqs)**2)[:, :n_samples].real
+    autocov = np.empty((n_params, n_samples))
+    for i in range(n_params):
+        freqs = np.fft.rfft(chains[:, :, i] - means[:, i, None], n_padded)
+        autocov[i] = np.mean(np.fft.irfft(np.abs(freqs)**2)[:, :n_samples].real, axis=0)
     autocov = autocov / np.arange(n_samples, 0, -1)
 
-    estimator_sum = 0.
-    lag = 1
-    while lag < n_samples:
-        # estimate multi-chain autocorrelation using variogram
-        temp = 1. - (var_within - np.mean(autocov[:, lag])) / var_pooled
+    # estimate multi-chain autocorrelations using variogram
+    with np.errstate(divide='ignore', invalid='ignore'):
+        temp = 1. - (var_within[:, None] - autocov[:, 1:]) / var_pooled[:, None]
 
-        # only use the first non-negative autocorrelations to avoid noise
-        if temp >= 0:
-            estimator_sum += temp
-            lag += 1
-        else:
-            break
+    # only use the first non-negative autocorrelations to avoid noise
+    first_ok = np.logical_and.accumulate(temp >= 0, axis=1)
+    estimator_sum = np.sum(np.where(first_ok, temp, 0.), axis=1)
 
     ess = n_chains * n_samples / (1. + 2. * estimator_sum)
 
-    return ess
+    return ess[0] if squeeze else ess
 
 
 def gelman_rubin_statistic(chains):
@@ -80,35 +79,44 @@ def gelman_rubin_statistic(chains):
 
     Parameters
     ----------
-    chains : np.array of shape (M, N)
+    chains : np.array of shape (M, N) or (M, N, D)
         Samples of a parameter from an MCMC algorithm, 1 row per chain. No burn-in subtracted here!
+        Several parameters can be given along the last axis.
 
     Returns
     -------
-    psrf : float
+    psrf : float or np.array of shape (D,)
         Should be below 1.1 to support convergence, or at least below 1.2 for all parameters.
 
     """
-    chains = np.atleast_2d(chains)
-    n_chains, n_samples = chains.shape
+    chains, squeeze = _chains_3d(chains)
+    n_chains, n_samples, n_params = chains.shape
 
     # split chains in the middle
     n_chains *= 2
     n_samples //= 2  # drop 1 if odd
-    chains = chains[:, :2 * n_samples].reshape((n_chains, n_samples))
+    chains = chains[:, :2 * n_samples].reshape((n_chains, n_samples, n_params))
 
     means = np.mean(chains, axis=1)
     variances = np.var(chains, ddof=1, axis=1)
 
-    var_between = n_samples * np.var(means, ddof=1)
-    var_within = np.mean(variances)
+    var_between = n_samples * np.var(means, ddof=1, axis=0)
+    var_within = np.mean(variances, axis=0)
 
     var_pooled = ((n_samples - 1.) * var_within + var_between) / n_samples
 
     # potential scale reduction factor, should be close to 1
     psrf = np.sqrt(var_pooled / var_within)
 
-    return psrf
+    return psrf[0] if squeeze else psrf
+
+
+def _chains_3d(chains):
+    """Return the chains as an array of shape (M, N, D) and whether D was added."""
+    chains = np.asanyarray(chains)
+    if chains.ndim == 3:
+        return chains, False
+    return np.atleast_2d(chains)[:, :, None], True
 
 
 def nuts(n_iter,
@@ -121,7 +129,9 @@ def nuts(n_iter,
          seed=0,
          info_freq=100,
          max_retry_inits=20,
-         stepsize=None):
+         stepsize=None,
+         inv_mass=None,
+         adapt_max_depth=False):
     r"""Sample the target using the NUTS algorithm.
 
     No-U-Turn Sampler, an improved version of the Hamiltonian (Markov Chain) Monte Carlo sampler.
@@ -153,6 +163,14 @@ def nuts(n_iter,
         How many times to retry finding initial stepsize (if stepped outside allowed region).
     stepsize : float, optional
         Initial stepsize (will be still adapted). Defaults to finding by trial and error.
+    inv_mass : np.array, optional
+        Inverse mass matrix of the momentum, either as a vector of the diagonal or as a full
+        matrix. A good approximation of the posterior covariance decorrelates the parameters
+        and shortens the adaptation. Defaults to the identity matrix.
+    adapt_max_depth : bool, optional
+        Lower the maximum recursion depth after the adaptation to one above the 95th
+        percentile of the depths reached during it. On smooth targets this limits the cost of
+        occasional long trajectories.
 
     Returns
     -------
@@ -169,6 +187,17 @@ def nuts(n_iter,
     if np.isinf(target0):
         raise ValueError("NUTS: Bad initialization point {}, logpdf -> -inf.".format(params0))
 
+    mass_factor = None
+    if inv_mass is not None:
+        inv_mass = np.asarray(inv_mass, dtype=float)
+        if inv_mass.shape == params0.shape:
+            mass_factor = 1. / np.sqrt(inv_mass)
+        elif inv_mass.shape == 2 * params0.shape:
+            mass_factor = np.linalg.cholesky(np.linalg.inv(inv_mass))
+        else:
+            raise ValueError("NUTS: The shape of inv_mass {} does not match the parameters {}."
+                             .format(inv_mass.shape, params0.shape))
+
     # ********************************
     # Find reasonable initial stepsize
     # ********************************
@@ -180,15 +209,15 @@ def nuts(n_iter,
         while init_tries < max_retry_inits:  # might step into region unallowed by priors
             stepsize = np.exp(-init_tries)
             init_tries += 1
-            momentum0 = random_state.randn(*params0.shape)
+            momentum0 = _draw_momentum(random_state, params0.shape, mass_factor)
 
             # leapfrog
             momentum1 = momentum0 + 0.5 * stepsize * grad0
-            params1 = params0 + stepsize * momentum1
+            params1 = params0 + stepsize * _velocity(momentum1, inv_mass)
             momentum1 += 0.5 * stepsize * grad_target(params1)
 
-            joint0 = target0 - 0.5 * momentum0.dot(momentum0)
-            joint1 = target(params1) - 0.5 * momentum1.dot(momentum1)
+            joint0 = target0 - 0.5 * momentum0.dot(_velocity(momentum0, inv_mass))
+            joint1 = target(params1) - 0.5 * momentum1.dot(_velocity(momentum1, inv_mass))
 
             if np.isfinite(joint1):
                 break
@@ -212,10 +241,10 @@ def nuts(n_iter,
 
             # leapfrog
             momentum1 = momentum0 + 0.5 * stepsize * grad0
-            params1 = params0 + stepsize * momentum1
+            params1 = params0 + stepsize * _velocity(momentum1, inv_mass)
             momentum1 += 0.5 * stepsize * grad_target(params1)
 
-            joint1 = target(params1) - 0.5 * momentum1.dot(momentum1)
+            joint1 = target(params1) - 0.5 * momentum1.dot(_velocity(momentum1, inv_mass))
 
     logger.debug("NUTS: Set initial stepsize {}.".format(stepsize))
 
@@ -235,17 +264,25 @@ def nuts(n_iter,
     n_diverged = 0  # counter for proposals whose error diverged
     n_outside = 0  # counter for proposals outside priors (pdf=0)
     n_total = 0  # total number of proposals
+    depths = np.zeros(n_adapt, dtype=int)  # tree depths reached during adaptation
+
+    # The log density and its gradient at the current sample are carried over from the
+    # tree building so that they need not be recomputed in the next iteration
+    target_prev = target0
+    grad_prev = grad_target(params0)
 
     for ii in range(1, n_iter + 1):
-        momentum0 = random_state.randn(*params0.shape)
+        momentum0 = _draw_momentum(random_state, params0.shape, mass_factor)
         samples_prev = samples[ii - 1, :]
-        log_joint0 = target(samples_prev) - 0.5 * momentum0.dot(momentum0)
+        log_joint0 = target_prev - 0.5 * momentum0.dot(_velocity(momentum0, inv_mass))
         log_slicevar = log_joint0 - random_state.exponential()
         samples[ii, :] = samples_prev
         params_left = samples_prev
         params_right = samples_prev
         momentum_left = momentum0
         momentum_right = momentum0
+        grad_left = grad_prev
+        grad_right = grad_prev
         depth = 0
         n_ok = 1
         all_ok = True  # criteria for no U-turn, diverging error
@@ -253,32 +290,35 @@ def nuts(n_iter,
         while all_ok and depth <= max_depth:
             direction = 1 if random_state.rand() < 0.5 else -1
             if direction == -1:
-                params_left, momentum_left, _, _, params1, n_sub, sub_ok, mh_ratio, n_steps, \
-                    is_div, is_out = _build_tree_nuts(
-                        params_left, momentum_left, log_slicevar, -stepsize, depth, log_joint0,
-                        target, grad_target, random_state)
+                params_left, momentum_left, grad_left, _, _, _, params1, grad1, target1, n_sub, \
+                    sub_ok, mh_ratio, n_steps, is_div, is_out = _build_tree_nuts(
+                        params_left, momentum_left, grad_left, log_slicevar, -stepsize, depth,
+                        log_joint0, target, grad_target, random_state, inv_mass)
             else:
-                _, _, params_right, momentum_right, params1, n_sub, sub_ok, mh_ratio, n_steps, \
-                    is_div, is_out = _build_tree_nuts(
-                        params_right, momentum_right, log_slicevar, stepsize, depth, log_joint0,
-                        target, grad_target, random_state)
+                _, _, _, params_right, momentum_right, grad_right, params1, grad1, target1, \
+                    n_sub, sub_ok, mh_ratio, n_steps, is_div, is_out = _build_tree_nuts(
+                        params_right, momentum_right, grad_right, log_slicevar, stepsize, depth,
+                        log_joint0, target, grad_target, random_state, inv_mass)
 
             if sub_ok == 1:
                 if random_state.rand() < float(n_sub) / n_ok:
                     samples[ii, :] = params1  # accept proposal
+                    target_prev = target1
+                    grad_prev = grad1
             n_ok += n_sub
             if not is_out:  # params1 outside allowed region; don't count this as diverging error
                 n_diverged += is_div
             n_outside += is_out
             n_total += n_steps
-            all_ok = sub_ok and ((params_right - params_left).dot(momentum_left) >= 0) \
-                and ((params_right - params_left).dot(momentum_right) >= 0)
+            all_ok = sub_ok and _no_u_turn(params_left, momentum_left, params_right,
+                                           momentum_right, inv_mass)
             depth += 1
             if depth > max_depth:
                 logger.debug("NUTS: Maximum recursion depth {} exceeded.".format(max_depth))
 
         # adjust stepsize according to target acceptance ratio
         if ii <= n_adapt:
+            depths[ii - 1] = depth - 1
             accept_ratio = (1. - 1. / (ii + ii_offset)) * accept_ratio \
                 + (target_prob - float(mh_ratio) / n_steps) / (ii + ii_offset)
             log_stepsize = target_stepsize - np.sqrt(ii) / shrinkage * accept_ratio
@@ -293,6 +333,9 @@ def nuts(n_iter,
             n_total = 0
             logger.info("NUTS: Adaptation/warmup finished. Sampling...")
             logger.debug("NUTS: Set final stepsize {}.".format(stepsize))
+            if adapt_max_depth and n_adapt > 0:
+                max_depth = min(max_depth, int(np.percentile(depths, 95)) + 1)
+                logger.debug("NUTS: Set maximum recursion depth {}.".format(max_depth))
 
         if ii % info_freq == 0 and ii < n_iter:
             logger.info("NUTS: Iterations performed: {}/{}...".format(ii, n_iter))
@@ -310,26 +353,32 @@ def nuts(n_iter,
     return samples[1:, :]
 
 
-def _build_tree_nuts(params, momentum, log_slicevar, step, depth, log_joint0, target, grad_target,
-                     random_state):
+def _build_tree_nuts(params, momentum, grad, log_slicevar, step, depth, log_joint0, target,
+                     grad_target, random_state, inv_mass=None):
     """Recursively build a balanced binary tree needed by NUTS.
 
     Based on Algorithm 6 in
     Hoffman & Gelman, JMLR 15, 1351-1381, 2014.
 
+    The gradient of the target at the trajectory ends and the target and its gradient at the
+    proposal are passed along with the points, so that each leapfrog step evaluates the
+    target and its gradient only once.
+
     """
     # Base case: one leapfrog step
     if depth == 0:
-        momentum1 = momentum + 0.5 * step * grad_target(params)
-        params1 = params + step * momentum1
-        momentum1 = momentum1 + 0.5 * step * grad_target(params1)
+        momentum1 = momentum + 0.5 * step * grad
+        params1 = params + step * _velocity(momentum1, inv_mass)
+        grad1 = grad_target(params1)
+        momentum1 = momentum1 + 0.5 * step * grad1
 
-        log_joint = target(params1) - 0.5 * momentum1.dot(momentum1)
+        target1 = target(params1)
+        log_joint = target1 - 0.5 * momentum1.dot(_velocity(momentum1, inv_mass))
         n_ok = float(log_slicevar <= log_joint)
         sub_ok = log_slicevar < (1000. + log_joint)  # check for diverging error
         is_out = False
         if not sub_ok:
-            if np.isinf(target(params1)):  # logpdf(params1) = -inf i.e. pdf(params1) = 0
+            if np.isinf(target1):  # logpdf(params1) = -inf i.e. pdf(params1) = 0
                 is_out = True
             else:
                 logger.debug(
@@ -339,39 +388,73 @@ def _build_tree_nuts(params, momentum, log_slicevar, step, depth, log_joint0, ta
         else:
             mh_ratio = min(1., np.exp(log_joint - log_joint0))
 
-        return params1, momentum1, params1, momentum1, params1, n_ok, sub_ok, mh_ratio, 1., \
-            not sub_ok, is_out
+        return params1, momentum1, grad1, params1, momentum1, grad1, params1, grad1, target1, \
+            n_ok, sub_ok, mh_ratio, 1., not sub_ok, is_out
 
     else:
         # Recursion to build subtrees, doubling size
-        params_left, momentum_left, params_right, momentum_right, params1, n_sub, sub_ok, \
-            mh_ratio, n_steps, is_div, is_out = _build_tree_nuts(
-                params, momentum, log_slicevar, step, depth - 1, log_joint0, target,
-                grad_target, random_state)
+        params_left, momentum_left, grad_left, params_right, momentum_right, grad_right, \
+            params1, grad1, target1, n_sub, sub_ok, mh_ratio, n_steps, is_div, is_out = \
+            _build_tree_nuts(params, momentum, grad, log_slicevar, step, depth - 1, log_joint0,
+                             target, grad_target, random_state, inv_mass)
 
         if sub_ok:  # recurse further
             if step < 0:
-                params_left, momentum_left, _, _, params2, n_sub2, sub_ok, mh_ratio2, n_steps2, \
-                    is_div, is_out = _build_tree_nuts(
-                        params_left, momentum_left, log_slicevar,
-                        step, depth - 1, log_joint0, target, grad_target, random_state)
+                params_left, momentum_left, grad_left, _, _, _, params2, grad2, target2, \
+                    n_sub2, sub_ok, mh_ratio2, n_steps2, is_div, is_out = _build_tree_nuts(
+                        params_left, momentum_left, grad_left, log_slicevar,
+                        step, depth - 1, log_joint0, target, grad_target, random_state,
+                        inv_mass)
             else:
-                _, _, params_right, momentum_right, params2, n_sub2, sub_ok, mh_ratio2, n_steps2, \
-                    is_div, is_out = _build_tree_nuts(
-                        params_right, momentum_right, log_slicevar,
-                        step, depth - 1, log_joint0, target, grad_target, random_state)
+                _, _, _, params_right, momentum_right, grad_right, params2, grad2, target2, \
+                    n_sub2, sub_ok, mh_ratio2, n_steps2, is_div, is_out = _build_tree_nuts(
+                        params_right, momentum_right, grad_right, log_slicevar,
+                        step, depth - 1, log_joint0, target, grad_target, random_state,
+                        inv_mass)
 
             if n_sub2 > 0:
                 if float(n_sub2) / (n_sub + n_sub2) > random_state.rand():
                     params1 = params2  # accept move
+                    grad1 = grad2
+                    target1 = target2
             mh_ratio += mh_ratio2
             n_steps += n_steps2
-            sub_ok = sub_ok and ((params_right - params_left).dot(momentum_left) >= 0) \
-                and ((params_right - params_left).dot(momentum_right) >= 0)
+            sub_ok = sub_ok and _no_u_turn(params_left, momentum_left, params_right,
+                                           momentum_right, inv_mass)
             n_sub += n_sub2
 
-        return params_left, momentum_left, params_right, momentum_right, params1, n_sub, sub_ok, \
-            mh_ratio, n_steps, is_div, is_out
+        return params_left, momentum_left, grad_left, params_right, momentum_right, grad_right, \
+            params1, grad1, target1, n_sub, sub_ok, mh_ratio, n_steps, is_div, is_out
+
+
+def _velocity(momentum, inv_mass):
+    """Return the rate of change of the parameters for the given momentum."""
+    if inv_mass is None:
+        return momentum
+    elif inv_mass.ndim == 1:
+        return inv_mass * momentum
+    return inv_mass.dot(momentum)
+
+
+def _draw_momentum(random_state, shape, mass_factor):
+    """Draw a momentum from a Gaussian whose covariance is the mass matrix.
+
+    `mass_factor` is the square root of the diagonal or the Cholesky factor of the mass matrix.
+
+    """
+    momentum = random_state.randn(*shape)
+    if mass_factor is None:
+        return momentum
+    elif mass_factor.ndim == 1:
+        return mass_factor * momentum
+    return mass_factor.dot(momentum)
+
+
+def _no_u_turn(params_left, momentum_left, params_right, momentum_right, inv_mass):
+    """Check that neither end of the trajectory has started moving towards the other."""
+    span = params_right - params_left
+    return (span.dot(_velocity(momentum_left, inv_mass)) >= 0) \
+        and (span.dot(_velocity(momentum_right, inv_mass)) >= 0)
 
 
 def metropolis(n_samples, params0, target, sigma_proposals, warmup=0, seed=0):
@@ -6,7 +6,7 @@ from typing import Callable, List
 
 import matplotlib.pyplot as plt
 import numpy as np
-import scipy.stats as ss
+from scipy.special import log_ndtr
 
 from elfi.methods.bo.utils import minimize
 from elfi.methods.utils import NDimBoundingBox
@@ -150,8 +150,8 @@ class BolfiPosterior:
             return logpdf
 
         mean, var = self.model.predict(x)
-        logpdf[logi] = ss.norm.logcdf(
-            self.threshold, mean, np.sqrt(var)).squeeze()
+        # log of the standard normal cdf without the overhead of scipy.stats
+        logpdf[logi] = log_ndtr((self.threshold - mean) / np.sqrt(var)).squeeze()
 
         if ndim == 0 or (ndim == 1 and self.dim > 1):
             logpdf = logpdf[0]
@@ -181,10 +181,10 @@ class BolfiPosterior:
             (self.threshold - mean) * 0.5 * grad_var / std
         factor = factor / var
         term = (self.threshold - mean) / std
-        pdf = ss.norm.pdf(term)
-        cdf = ss.norm.cdf(term)
+        # ratio of the standard normal pdf and cdf, computed in log space for stable tails
+        pdf_per_cdf = np.exp(-0.5 * term**2 - log_ndtr(term)) / np.sqrt(2 * np.pi)
 
-        grad[logi, :] = factor * pdf / cdf
+        grad[logi, :] = factor * pdf_per_cdf
 
         if ndim == 0 or (ndim == 1 and self.dim > 1):
             grad = grad[0]
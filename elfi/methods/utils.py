@@ -6,7 +6,8 @@ from typing import Union
 
 import matplotlib.pyplot as plt
 import numpy as np
-import scipy.stats as ss
+import scipy.linalg as sl
+from scipy.special import logsumexp
 
 logger = logging.getLogger(__name__)
 
@@ -59,11 +60,18 @@ def batch_to_arr2d(batches, names):
     if not isinstance(batches, list):
         batches = [batches]
 
-    rows = []
+    n_rows = sum(np.size(batch_[names[0]]) for batch_ in batches)
+    dtype = np.result_type(*[batch_[n] for batch_ in batches for n in names])
+    out = np.empty((n_rows, len(names)), dtype=dtype)
+
+    start = 0
     for batch_ in batches:
-        rows.append(np.column_stack([batch_[n] for n in names]))
+        end = start + np.size(batch_[names[0]])
+        for j, n in enumerate(names):
+            out[start:end, j] = np.reshape(batch_[n], -1)
+        start = end
 
-    return np.vstack(rows)
+    return out
 
 
 def ceil_to_batch_size(num, batch_size):
@@ -100,10 +108,8 @@ def compute_ess(weights: Union[None, np.ndarray] = None):
     # normalize weights
     weights = normalize_weights(weights)
 
-    # compute ESS
-    numer = np.square(np.sum(weights))
-    denom = np.sum(np.square(weights))
-    return numer / denom
+    # compute ESS, the numerator (sum of the weights)**2 is one after normalization
+    return 1. / np.dot(weights, weights)
 
 
 def weighted_var(x, weights=None):
@@ -132,16 +138,23 @@ def weighted_var(x, weights=None):
         weights = np.ones(len(x))
 
     V_1 = np.sum(weights)
-    V_2 = np.sum(weights ** 2)
+    V_2 = np.dot(weights, weights)
 
-    xbar = np.average(x, weights=weights, axis=0)
-    numerator = weights.dot((x - xbar) ** 2)
+    xbar = weights.dot(x) / V_1
+    # Square the centered values in place to avoid a second x-sized temporary
+    sq_diff = np.subtract(x, xbar, dtype=float)
+    sq_diff *= sq_diff
+    numerator = weights.dot(sq_diff)
     s2 = numerator / (V_1 - (V_2 / V_1))
     return s2
 
 
 class GMDistribution:
-    """Gaussian mixture distribution with a shared covariance matrix."""
+    """Gaussian mixture distribution with a shared covariance matrix.
+
+    The shared covariance can be given as a full matrix, as a 1d array of variances of a
+    diagonal covariance matrix or as a scalar variance.
+    """
 
     @classmethod
     def pdf(cls, x, means, cov=1, weights=None):
@@ -157,26 +170,11 @@ class GMDistribution:
         weights : array_like
             1d array of weights of the gaussian mixture components
         cov : array_like, float
-            A shared covariance matrix for the mixture components
+            A shared covariance matrix for the mixture components. A 1d array or a scalar
+            is interpreted as the variances of a diagonal covariance matrix.
 
         """
-        means, weights = cls._normalize_params(means, weights)
-
-        ndim = np.asanyarray(x).ndim
-        if means.ndim == 1:
-            x = np.atleast_1d(x)
-        if means.ndim == 2:
-            x = np.atleast_2d(x)
-
-        d = np.zeros(len(x))
-        for m, w in zip(means, weights):
-            d += w * ss.multivariate_normal.pdf(x, mean=m, cov=cov)
-
-        # Cast to correct ndim
-        if ndim == 0 or (ndim == 1 and means.ndim == 2):
-            return d.squeeze()
-        else:
-            return d
+        return np.exp(cls.logpdf(x, means=means, cov=cov, weights=weights))
 
     @classmethod
     def logpdf(cls, x, means, cov=1, weights=None):
@@ -192,10 +190,25 @@ class GMDistribution:
         weights : array_like
             1d array of weights of the gaussian mixture components
         cov : array_like, float
-            A shared covariance matrix for the mixture components
+            A shared covariance matrix for the mixture components. A 1d array or a scalar
+            is interpreted as the variances of a diagonal covariance matrix.
 
         """
-        return np.log(cls.pdf(x, means=means, cov=cov, weights=weights))
+        means, weights = cls._normalize_params(means, weights)
+
+        ndim = np.asanyarray(x).ndim
+        if means.ndim == 1:
+            x = np.atleast_1d(x)
+        if means.ndim == 2:
+            x = np.atleast_2d(x)
+
+        d = logsumexp(cls._logpdf_components(x, means, cov, weights), axis=1)
+
+        # Cast to correct ndim
+        if ndim == 0 or (ndim == 1 and means.ndim == 2):
+            return d.squeeze()
+        else:
+            return d
 
     @classmethod
     def rvs(cls, means, cov=1, weights=None, size=1, prior_logpdf=None, random_state=None):
@@ -206,7 +219,8 @@ class GMDistribution:
         means : array_like
             Means of the Gaussian mixture components
         cov : array_like, optional
-            A shared covariance matrix for the mixture components
+            A shared covariance matrix for the mixture components. A 1d array or a scalar
+            is interpreted as the variances of a diagonal covariance matrix.
         weights : array_like, optional
             1d array of weights of the gaussian mixture components
         size : int or tuple or None, optional
@@ -228,21 +242,43 @@ class GMDistribution:
 
         output = np.empty((size,) + means.shape[1:])
 
+        # Choosing the components by inverting the cdf of the weights is what
+        # random_state.choice does, but without rebuilding the cdf on every round
+        cdf = np.cumsum(weights)
+        cdf /= cdf[-1]
+
+        # Factorize the covariance once for all the proposals
+        if np.ndim(cov) < 2:
+            scale = np.sqrt(cov)
+        else:
+            chol_t = np.linalg.cholesky(cov).T
+
         n_accepted = 0
         n_left = size
         trials = 0
+        acceptance_rate = 1.
         while n_accepted < size:
-            inds = random_state.choice(len(means), size=n_left, p=weights)
+            # After a round with rejections, oversample by the observed acceptance rate so that
+            # the next round is usually enough
+            n_proposed = n_left
+            if acceptance_rate < 1:
+                n_proposed = int(ceil(1.3 * n_left / acceptance_rate))
+
+            inds = cdf.searchsorted(random_state.random_sample(n_proposed), side='right')
             rvs = means[inds]
-            perturb = ss.multivariate_normal.rvs(mean=means[0] * 0,
-                                                 cov=cov,
-                                                 random_state=random_state,
-                                                 size=n_left)
+            perturb = random_state.standard_normal((n_proposed, ) + means.shape[1:])
+            if np.ndim(cov) < 2:
+                perturb *= scale
+            else:
+                perturb = perturb.reshape((n_proposed, -1)).dot(chol_t).reshape(perturb.shape)
             x = rvs + perturb
 
             # check validity of x
             if prior_logpdf is not None:
-                x = x[np.isfinite(prior_logpdf(x))]
+                valid = np.isfinite(prior_logpdf(x))
+                # Limit the oversampling to 13-fold
+                acceptance_rate = max(np.mean(valid), .1)
+                x = x[valid][:n_left]
 
             n_accepted1 = len(x)
             output[n_accepted: n_accepted + n_accepted1] = x
@@ -261,6 +297,41 @@ class GMDistribution:
         else:
             return output
 
+    @staticmethod
+    def _logpdf_components(x, means, cov, weights):
+        """Evaluate the weighted log densities of all mixture components at points x.
+
+        The covariance is factorized only once and the differences of all the points to all
+        the means are whitened together. The differences are taken before whitening, so that
+        far apart and narrow components do not lose precision.
+
+        Returns
+        -------
+        np.ndarray
+            Array of shape (n_points, n_components).
+
+        """
+        dim = 1 if means.ndim == 1 else means.shape[1]
+        x = np.reshape(x, (-1, dim))
+        means = np.reshape(means, (-1, dim))
+        diff = x[:, None, :] - means[None, :, :]
+
+        if np.ndim(cov) < 2:
+            var = np.broadcast_to(np.asanyarray(cov, dtype=float), (dim, ))
+            diff = diff / np.sqrt(var)
+            log_det = np.sum(np.log(var))
+        else:
+            chol = sl.cholesky(cov, lower=True)
+            diff = sl.solve_triangular(chol, diff.reshape((-1, dim)).T, lower=True).T
+            diff = diff.reshape((len(x), len(means), dim))
+            log_det = 2 * np.sum(np.log(np.diag(chol)))
+
+        sq_dist = np.sum(diff**2, axis=-1)
+
+        with np.errstate(divide='ignore'):
+            log_weights = np.log(weights)
+        return log_weights - .5 * (sq_dist + dim * np.log(2 * np.pi) + log_det)
+
     @staticmethod
     def _normalize_params(means, weights):
         means = np.atleast_1d(np.squeeze(means))
@@ -284,7 +355,9 @@ def numgrad(fn, x, h=None, replace_neg_inf=True):
     h : float or list
         Stepsize or stepsizes for the dimensions
     replace_neg_inf : bool
-        Replace neg inf fn values with gradient 0 (useful for logpdf gradients)
+        Set the gradient to 0 in the dimensions where either of the two evaluations is
+        neg inf (useful for logpdf gradients). The other dimensions keep their finite
+        difference. Note that fn is not evaluated at x itself.
 
     Returns
     -------
@@ -292,27 +365,21 @@ def numgrad(fn, x, h=None, replace_neg_inf=True):
         1D gradient vector
 
     """
-    h = 0.00001 if h is None else h
-    h = np.asanyarray(h).reshape(-1)
-
-    x = np.asanyarray(x, dtype=np.float).reshape(-1)
+    x = np.asanyarray(x, dtype=float).reshape(-1)
     dim = len(x)
-    X = np.zeros((dim * 3, dim))
-
-    for i in range(3):
-        Xi = np.tile(x, (dim, 1))
-        np.fill_diagonal(Xi, Xi.diagonal() + (i - 1) * h)
-        X[i * dim:(i + 1) * dim, :] = Xi
+    h = 0.00001 if h is None else h
+    h = np.broadcast_to(np.asanyarray(h, dtype=float).reshape(-1), (dim, ))
 
-    f = fn(X)
-    f = f.reshape((3, dim))
+    # Central differences from a single call of fn
+    steps = np.diag(h)
+    f = fn(np.vstack((x + steps, x - steps)))
+    f = np.reshape(f, (2, dim))
 
+    with np.errstate(invalid='ignore'):
+        grad = (f[0] - f[1]) / (2 * h)
     if replace_neg_inf:
-        if np.any(np.isneginf(f)):
-            return np.zeros(dim)
-
-    grad = np.gradient(f, *h, axis=0)
-    return grad[1, :]
+        grad[np.isneginf(f).any(axis=0)] = 0
+    return grad
 
 
 def sample_object_to_dict(data, elem, skip=''):
@@ -334,8 +401,7 @@ def sample_object_to_dict(data, elem, skip=''):
         if key in ['outputs', skip]:
             continue
         if key == 'meta':
-            for meta_key, meta_val in elem.__dict__[key].items():
-                data[meta_key] = meta_val
+            data.update(val)
             continue
         data[key] = val
 
@@ -353,28 +419,19 @@ def numpy_to_python_type(data):
         # in data there is keys as 'samples' which is actually a dictionary
         if isinstance(val, dict):
             for nested_key, nested_val in val.items():
-                is_numpy = type(nested_val)
-                data_type = str(is_numpy)
-                # check whether the current value has numpy data type
-                if is_numpy.__module__ == np.__name__:
-                    # it is enough to check that current value's name has one of these sub-strings
-                    # https://docs.scipy.org/doc/numpy-1.13.0/user/basics.types.html
-                    if 'array' in data_type:
-                        data[key][nested_key] = nested_val.tolist()
-                    elif 'int' in data_type:
-                        data[key][nested_key] = int(nested_val)
-                    elif 'float' in data_type:
-                        data[key][nested_key] = float(nested_val)
-
-        is_numpy = type(val)
-        data_type = str(is_numpy)
-        if is_numpy.__module__ == np.__name__:
-            if 'array' in data_type:
-                data[key] = val.tolist()
-            elif 'int' in data_type:
-                data[key] = int(val)
-            elif 'float' in data_type:
-                data[key] = float(val)
+                val[nested_key] = _numpy_to_python_value(nested_val)
+        else:
+            data[key] = _numpy_to_python_value(val)
+
+
+def _numpy_to_python_value(val):
+    if isinstance(val, np.ndarray):
+        return val.tolist()
+    elif isinstance(val, np.integer):
+        return int(val)
+    elif isinstance(val, np.floating):
+        return float(val)
+    return val
 
 
 def weighted_sample_quantile(x, alpha, weights=None):
@@ -439,6 +496,7 @@ class NDimBoundingBox:
         self.eps_region = eps_region
 
         self.rotation_inv = np.linalg.inv(self.rotation)
+        self._offset = np.dot(self.rotation_inv, -self.center)
 
         self.volume = self._compute_volume()
 
@@ -465,16 +523,28 @@ class NDimBoundingBox:
         assert point.ndim == 1
         assert point.shape[0] == self.dim
 
+        return bool(self.contains_many(point[None, :])[0])
+
+    def contains_many(self, points):
+        """Check which of the points are inside the bounding box.
+
+        Parameters
+        ----------
+        points: (N, D)
+
+        Returns
+        -------
+        np.ndarray, shape: (N,) of booleans
+
+        """
+        assert points.ndim == 2
+        assert points.shape[1] == self.dim
+
         # transform to bb coordinate system
-        point1 = np.dot(self.rotation_inv, point) + np.dot(self.rotation_inv, -self.center)
+        points1 = np.dot(points, self.rotation_inv.T) + self._offset
 
-        # Check if point is inside bounding box
-        inside = True
-        for i in range(point1.shape[0]):
-            if (point1[i] < self.limits[i][0]) or (point1[i] > self.limits[i][1]):
-                inside = False
-                break
-        return inside
+        # Check if points are inside bounding box
+        return np.all((points1 >= self.limits[:, 0]) & (points1 <= self.limits[:, 1]), axis=1)
 
     def sample(self, n2, seed=None):
         """Sample n2 points from the posterior.
@@ -482,7 +552,7 @@ class NDimBoundingBox:
         Parameters
         ----------
         n2: int
-        seed: seed of the sampling procedure
+        seed: seed of the sampling procedure, a RandomState or None for the global random state
 
         Returns
         -------
@@ -496,15 +566,18 @@ class NDimBoundingBox:
         loc = limits[:, 0]
         scale = limits[:, 1] - limits[:, 0]
 
-        # draw n2 samples
-        theta = []
-        for i in range(loc.shape[0]):
-            rv = ss.uniform(loc=loc[i], scale=scale[i])
-            theta.append(rv.rvs(size=(n2, 1), random_state=seed))
+        # draw n2 samples, all dimensions at once
+        # None uses the global random state, as scipy does
+        if seed is None:
+            random_state = np.random
+        elif isinstance(seed, np.random.RandomState):
+            random_state = seed
+        else:
+            random_state = np.random.RandomState(seed)
+        theta = random_state.uniform(size=(n2, self.dim)) * scale + loc
 
-        theta = np.concatenate(theta, -1)
         # translate and rotate
-        theta_new = np.dot(rot, theta.T).T + center
+        theta_new = np.dot(theta, rot.T) + center
 
         return theta_new
 
@@ -513,13 +586,15 @@ class NDimBoundingBox:
 
         Parameters
         ----------
-        theta: np.ndarray (D,)
+        theta: np.ndarray (D,) or (N, D)
 
         Returns
         -------
-        float
+        float or np.ndarray (N,)
 
         """
+        if theta.ndim == 2:
+            return self.contains_many(theta) / self.volume
         return self.contains(theta) / self.volume
 
     def plot(self, samples):
@@ -624,7 +699,4 @@ def flat_array_to_dict(names, arr):
 
     # TODO: This approach covers only the case where all parameters
     # TODO: are univariate variables (i.e. independent between them)
-    param_dict = {}
-    for ii, param_name in enumerate(names):
-        param_dict[param_name] = np.expand_dims(arr[ii:ii + 1], 0)
-    return param_dict
+    return {param_name: arr[None, ii:ii + 1] for ii, param_name in enumerate(names)}
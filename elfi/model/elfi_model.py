@@ -8,6 +8,7 @@ https://en.wikipedia.org/wiki/Directed_acyclic_graph
 """
 
 import inspect
+import linecache
 import logging
 import os
 import pickle
@@ -33,6 +34,10 @@ __all__ = [
 logger = logging.getLogger(__name__)
 _default_model = None
 
+# For inspecting the node names from the code
+_super_call_rex = re.compile(r'\s*super\(')
+_assignment_rexes = {}
+
 
 def get_default_model():
     """Return the current default ``ElfiModel`` instance.
@@ -121,6 +126,17 @@ def random_name(length=4, prefix=''):
     return prefix + str(uuid.uuid4().hex[0:length])
 
 
+def _get_code_line(frame):
+    """Return the line of source code being executed in frame.
+
+    Reading the line from linecache avoids the module lookups of inspect.getframeinfo.
+    """
+    code_line = linecache.getline(frame.f_code.co_filename, frame.f_lineno, frame.f_globals)
+    if not code_line:
+        raise ValueError('The source code of the frame is not available.')
+    return code_line
+
+
 # TODO: move to another file?
 class ComputationContext:
     """Container object for key components for consistent computation results.
@@ -659,17 +675,20 @@ class NodeReference(InstructionsMapper):
         # Frames are available
         # Take the callers frame
         frame = frame.f_back.f_back.f_back
-        info = inspect.getframeinfo(frame, 1)
+        code_line = _get_code_line(frame)
 
         # Skip super calls to find the assignment frame
-        while re.match(r'\s*super\(', info.code_context[0]):
+        while _super_call_rex.match(code_line):
             frame = frame.f_back
-            info = inspect.getframeinfo(frame, 1)
+            code_line = _get_code_line(frame)
 
         # Match simple direct assignment with the class name, no commas or semicolons
         # Also do not accept a name starting with an underscore
-        rex = r'\s*([^\W_][\w]*)\s*=\s*\w?[\w\.]*{}\('.format(self.__class__.__name__)
-        match = re.match(rex, info.code_context[0])
+        cls = self.__class__
+        if cls not in _assignment_rexes:
+            _assignment_rexes[cls] = re.compile(
+                r'\s*([^\W_][\w]*)\s*=\s*\w?[\w\.]*{}\('.format(cls.__name__))
+        match = _assignment_rexes[cls].match(code_line)
         if match:
             name = match.groups()[0]
             return name
@@ -1,10 +1,11 @@
 """Extensions: ScipyLikeDistribution."""
 
+import threading
+
 import numpy as np
 
 import elfi.model.augmenter as augmenter
 from elfi.clients.native import Client
-from elfi.methods.utils import numgrad
 from elfi.model.elfi_model import ComputationContext
 
 
@@ -139,6 +140,25 @@ class ModelPrior:
         self._pdf_net = self.client.compile(model.source_net, outputs=self._pdf_node)
         self._logpdf_net = self.client.compile(model.source_net, outputs=self._logpdf_node)
 
+        # The execution order of the pdf nets is resolved only once
+        self._executor_caches = {self._pdf_node: {}, self._logpdf_node: {}}
+        # The latest loaded pdf nets and their batch sizes. The nets are modified during
+        # evaluation, so the access is serialized with a lock.
+        self._loaded_nets = {}
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        """Return the state for pickling, without the lock and the loaded nets."""
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_loaded_nets'] = {}
+        return state
+
+    def __setstate__(self, state):
+        """Restore the pickled state with a new lock."""
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
     def rvs(self, size=None, random_state=None):
         """Sample the joint prior."""
         random_state = np.random if random_state is None else random_state
@@ -180,17 +200,35 @@ class ModelPrior:
         x = x.reshape((-1, self.dim))
         batch = self._to_batch(x)
 
-        # TODO: we could add a seed value that would load a "random state" instance
-        #       throwing an error if it is used, for instance seed="not used".
-        context = ComputationContext(len(x), seed=0)
-        loaded_net = self.client.load_data(net, context, batch_index=0)
-
-        # Override
-        for k, v in batch.items():
-            loaded_net.nodes[k].update({'output': v})
-            del loaded_net.nodes[k]['operation']
-
-        val = self.client.compute(loaded_net)[node]
+        with self._lock:
+            # Load the net only when the batch size changes
+            batch_size, loaded_net, operations = self._loaded_nets.get(node, (None, None, None))
+            if batch_size != len(x):
+                # TODO: we could add a seed value that would load a "random state" instance
+                #       throwing an error if it is used, for instance seed="not used".
+                # No random numbers are drawn, and the global random state is the cheapest
+                # to load
+                context = ComputationContext(len(x), seed='global')
+                context.caches['executor'] = self._executor_caches[node]
+                loaded_net = self.client.load_data(net, context, batch_index=0)
+                for k in batch:
+                    del loaded_net.nodes[k]['operation']
+                operations = {n: attr['operation'] for n, attr in loaded_net.nodes(data=True)
+                              if 'operation' in attr}
+                self._loaded_nets[node] = (len(x), loaded_net, operations)
+
+            # Executing replaces the operations of the nodes with outputs, so restore them
+            # after, also if the computation fails
+            try:
+                # Override
+                for k, v in batch.items():
+                    loaded_net.nodes[k]['output'] = v
+                val = self.client.compute(loaded_net)[node]
+            finally:
+                for n, operation in operations.items():
+                    attr = loaded_net.nodes[n]
+                    attr.pop('output', None)
+                    attr['operation'] = operation
         if ndim == 0 or (ndim == 1 and self.dim > 1):
             val = val[0]
 
@@ -214,12 +252,17 @@ class ModelPrior:
         ndim = x.ndim
         x = x.reshape((-1, self.dim))
 
-        grads = np.zeros_like(x)
+        h = 0.00001 if stepsize is None else stepsize
+        h = np.broadcast_to(np.asanyarray(h, dtype=float).reshape(-1), (self.dim, ))
 
-        for i in range(len(grads)):
-            xi = x[i]
-            grads[i] = numgrad(self.logpdf, xi, h=stepsize)
+        # Central differences for all the points from a single evaluation of the prior
+        steps = np.diag(h)
+        x_eval = np.concatenate((x[:, None, :] + steps, x[:, None, :] - steps))
+        f = self.logpdf(x_eval.reshape((-1, self.dim))).reshape((2, len(x), self.dim))
 
+        with np.errstate(invalid='ignore'):
+            grads = (f[0] - f[1]) / (2 * h)
+        grads[np.isneginf(f).any(axis=0)] = 0
         grads[np.isinf(grads)] = 0
         grads[np.isnan(grads)] = 0
 
@@ -1,9 +1,12 @@
 """This module implements testbench-functionality in elfi."""
 
 import logging
+import pickle
+from multiprocessing import Pool
 
 import numpy as np
 
+import elfi.client
 from elfi.visualization.visualization import ProgressBar
 
 logger = logging.getLogger(__name__)
@@ -25,6 +28,8 @@ class Testbench:
         List of elfi-inference methods.
     repetitions : int
         How many repetitions of models is included in the testbench.
+    num_processes : int
+        How many repetitions are run in parallel.
     seed : int, optional
 
 
@@ -37,6 +42,7 @@ class Testbench:
                  reference_parameter=None,
                  reference_posterior=None,
                  progress_bar=True,
+                 num_processes=1,
                  seed=None):
         """Construct the testbench object.
 
@@ -54,6 +60,14 @@ class Testbench:
             A sample from a reference posterior.
         progress_bar : boolean
             Indicate whether to display testbench progressbar.
+        num_processes : int, optional
+            Number of processes used for running the repetitions of a method in parallel.
+            The default 1 runs them sequentially. The repetitions are independent and
+            seeded, so the results do not depend on this. The parallel repetitions use the
+            native client of their own process. The model and the methods are pickled to
+            the worker processes, so their user functions must be picklable, e.g. defined
+            at the top level of an importable module instead of lambdas or functions in
+            `__main__`. Otherwise the repetitions are run sequentially.
         seed : int, optional
 
         """
@@ -62,6 +76,7 @@ class Testbench:
         self.method_list = []
         self.method_seed_list = []
         self.repetitions = repetitions
+        self.num_processes = num_processes
         self.rng = np.random.RandomState(seed)
 
         if observations is not None:
@@ -107,8 +122,10 @@ class Testbench:
 
     def _resolve_test_type(self):
         self._set_default_test_type()
-        self._resolve_observations()
+        # The given reference parameters are repeated first, so that the observations
+        # are generated from one value per repetition
         self._resolve_reference_parameters()
+        self._resolve_observations()
 
     def _set_default_test_type(self):
         self.description = {
@@ -120,18 +137,17 @@ class Testbench:
     def _resolve_reference_parameters(self):
         if self.description['reference_parameters_available']:
             for keys, values in self.reference_parameter.items():
+                values = np.asarray(values)
+                # A batch of one, e.g. from model.generate, holds a single value
+                if values.ndim > 0 and len(values) == 1:
+                    values = values[0]
+                # Repeat along a new leading axis, so that vector values stay intact
                 self.reference_parameter[keys] = np.repeat(
-                    values,
-                    repeats=self.repetitions
+                    values[np.newaxis],
+                    repeats=self.repetitions,
+                    axis=0
                     )
 
-        elif not self.description['observations_available']:
-            seed = self._get_seeds(n_rep=1)
-            self.reference_parameter = self.model.generate(
-                batch_size=self.repetitions,
-                outputs=self.model.parameter_names,
-                seed=seed[0])
-
     def _resolve_observations(self):
         if self.description['observations_available']:
             self.observations = np.repeat(
@@ -139,12 +155,22 @@ class Testbench:
                 repeats=self.repetitions,
                 axis=0)
         else:
+            # Without reference parameters they are generated together with the
+            # observations, so that each observation comes from its reference parameter
+            outputs = [self.simulator_name]
+            if not self.description['reference_parameters_available']:
+                outputs += self.model.parameter_names
+
             seed = self._get_seeds(n_rep=1)
-            self.observations = self.model.generate(
+            generated = self.model.generate(
                 with_values=self.reference_parameter,
-                outputs=self.simulator_name,
+                outputs=outputs,
                 batch_size=self.repetitions,
-                seed=seed[0])[self.simulator_name]
+                seed=seed[0])
+
+            self.observations = generated.pop(self.simulator_name)
+            if not self.description['reference_parameters_available']:
+                self.reference_parameter = generated
 
     def add_method(self, new_method):
         """Add a new method to the testbench.
@@ -173,23 +199,57 @@ class Testbench:
                 )
 
     def _repeat_inference(self, method, seed_list):
-        repeated_result = []
-        model = self.model.copy()
-        for i in np.arange(self.repetitions):
-            if self.progress_bar:
-                self.progress_bar.update_progressbar(i + 1, self.repetitions)
+        if self.num_processes > 1 and self._is_picklable(method):
+            repeated_result = self._repeat_inference_parallel(method, seed_list)
+        else:
+            repeated_result = []
+            model = self.model.copy()
+            for i in np.arange(self.repetitions):
+                if self.progress_bar:
+                    self.progress_bar.update_progressbar(i + 1, self.repetitions)
 
-            model.observed[self.simulator_name] = np.atleast_2d(self.observations[i])
+                model.observed[self.simulator_name] = np.atleast_2d(self.observations[i])
 
-            repeated_result.append(
-                self._draw_posterior_sample(method, model, seed_list[i])
-                )
+                repeated_result.append(
+                    self._draw_posterior_sample(method, model, seed_list[i])
+                    )
 
         return self._collect_results(
             method.attributes['name'],
             repeated_result)
 
-    def _draw_posterior_sample(self, method, model, seed):
+    def _repeat_inference_parallel(self, method, seed_list):
+        # The model is sent to each worker only once, the tasks carry the observations
+        args = ((method, np.atleast_2d(self.observations[i]), seed_list[i])
+                for i in range(self.repetitions))
+
+        repeated_result = []
+        with Pool(self.num_processes, initializer=_init_worker,
+                  initargs=(self.model, self.simulator_name)) as pool:
+            for result in pool.imap(_worker_draw_posterior_sample, args):
+                repeated_result.append(result)
+                if self.progress_bar:
+                    self.progress_bar.update_progressbar(len(repeated_result),
+                                                         self.repetitions)
+
+        return repeated_result
+
+    def _is_picklable(self, method):
+        # Checked independently of the start method so that the behaviour is the same on
+        # all platforms, under `spawn` the workers could not even be started otherwise
+        try:
+            pickle.dumps((self.model, method))
+        except (pickle.PicklingError, AttributeError, TypeError) as e:
+            logger.warning('Running the repetitions of {} sequentially, since the model or '
+                           'the method cannot be pickled to the worker processes: {}. '
+                           'Define the user functions at the top level of an importable '
+                           'module to run them in parallel.'
+                           .format(method.attributes['name'], e))
+            return False
+        return True
+
+    @staticmethod
+    def _draw_posterior_sample(method, model, seed):
         method_instance = method.attributes['callable'](
             model,
             **method.attributes['method_kwargs'],
@@ -205,9 +265,14 @@ class Testbench:
         return method_instance.sample(**sampler_kwargs)
 
     def _collect_results(self, name, results):
+        # Sample.sample_means averages all the parameters on every access, so the means
+        # of the repetitions are computed once here
+        sample_means = [result.sample_means for result in results]
         result_dictionary = {
             'method': name,
-            'results': results
+            'results': results,
+            'sample_means': {param_name: np.array([means[param_name] for means in sample_means])
+                             for param_name in self.param_names}
         }
         return result_dictionary
 
@@ -238,24 +303,43 @@ class Testbench:
         return sample_mean_difference_results
 
     def _get_sample_mean_difference(self, method):
+        # Each repetition is compared with its own reference parameter value
         sample_mean_difference = {}
         for param_names in self.param_names:
-            sample_mean_difference[param_names] = [
-                results.sample_means[param_names] - self.reference_parameter[param_names][0]
-                for results in method['results']
-            ]
+            sample_means = method['sample_means'][param_names]
+            reference = np.reshape(self.reference_parameter[param_names],
+                                   (self.repetitions, ) + sample_means.shape[1:])
+            sample_mean_difference[param_names] = sample_means - reference
 
         return sample_mean_difference
 
 
+# The state of a Testbench worker process, set by the pool initializer
+_worker_state = {}
+
+
+def _init_worker(model, simulator_name):
+    # A forked worker inherits the client of the parent, e.g. a multiprocessing pool
+    elfi.client.set_client('native')
+    _worker_state['model'] = model.copy()
+    _worker_state['simulator_name'] = simulator_name
+
+
+def _worker_draw_posterior_sample(args):
+    method, observation, seed = args
+    model = _worker_state['model']
+    model.observed[_worker_state['simulator_name']] = observation
+    return Testbench._draw_posterior_sample(method, model, seed)
+
+
 class TestbenchMethod:
     """Container for ParameterInference methods included in Testbench."""
 
     def __init__(self,
                  method,
-                 method_kwargs={},
-                 fit_kwargs={},
-                 sample_kwargs={},
+                 method_kwargs=None,
+                 fit_kwargs=None,
+                 sample_kwargs=None,
                  name=None):
         """Construct the TestbenchMethod container.
 
@@ -263,11 +347,11 @@ class TestbenchMethod:
         ----------
         method : elfi.ParameterInference
             elfi.ParameterInfence-method which is included in Testbench.
-        method_kwargs :
+        method_kwargs : dict, optional
             Options of elfi.ParameterInference-method
-        fit_kwargs :
+        fit_kwargs : dict, optional
             Options of elfi.ParameterInference.fit-method
-        sample_kwargs :
+        sample_kwargs : dict, optional
             Options of elfi.ParameterInference.sample-method
         name : string, optional
             Name used the testbench
@@ -275,9 +359,9 @@ class TestbenchMethod:
         """
         name = name or method.__name__
         self.attributes = {'callable': method,
-                           'method_kwargs': method_kwargs,
-                           'fit_kwargs': fit_kwargs,
-                           'sample_kwargs': sample_kwargs,
+                           'method_kwargs': method_kwargs or {},
+                           'fit_kwargs': fit_kwargs or {},
+                           'sample_kwargs': sample_kwargs or {},
                            'name': name}
 
     def set_method_kwargs(self, **kwargs):
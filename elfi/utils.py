@@ -1,5 +1,6 @@
 """Common utilities."""
 
+import secrets
 import uuid
 
 import networkx as nx
@@ -23,11 +24,12 @@ def scipy_from_str(name):
 
 
 def random_seed():
-    """Extract the seed from numpy RandomState.
+    """Return a random 32 bit integer seed drawn from the OS entropy source.
 
-    Alternative would be to use os.urandom(4) cast as int.
+    Unlike seeding a new numpy RandomState and extracting a word from its state, this
+    does not allocate a full Mersenne Twister state for every seed.
     """
-    return np.random.RandomState().get_state()[1][1]
+    return secrets.randbits(32)
 
 
 def random_name(length=4, prefix=''):
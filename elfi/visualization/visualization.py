@@ -376,6 +376,9 @@ def plot_discrepancy(gp, parameter_names, axes=None, **kwargs):
     gp : GPyRegression target model, required
     parameter_names : dict, required
         Parameter names from model.parameters dict('parameter_name':(lower, upper), ... )`
+    kwargs
+        Options for `plt.subplots` and `plt.Axes.scatter`. The points are rasterized by
+        default for large evidence sets, which can be overridden with `rasterized`.
 
     Returns
     -------
@@ -393,6 +396,9 @@ def plot_discrepancy(gp, parameter_names, axes=None, **kwargs):
     axes, kwargs = _create_axes(axes, shape, **kwargs)
     axes = axes.ravel()
 
+    # large evidence sets are rasterized to keep vector output small and fast to draw
+    if gp.n_evidence > 1000:
+        kwargs['rasterized'] = kwargs.get('rasterized', True)
     for ii in range(n_plots):
         axes[ii].scatter(gp.X[:, ii], gp.Y[:, 0], **kwargs)
         axes[ii].set_xlabel(parameter_names[ii])
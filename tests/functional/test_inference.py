@@ -75,6 +75,20 @@ def test_rejection_with_threshold():
     assert len(np.unique(res.discrepancies)) == N
 
 
+def test_rejection_with_sample_dtype():
+    m, true_params = setup_ma2_with_informative_data()
+
+    N = 1000
+    rej = elfi.Rejection(m['d'], batch_size=20000, sample_dtype=np.float32)
+    res = rej.sample(N, quantile=.01)
+
+    check_inference_with_informative_data(res.samples, N, true_params)
+
+    assert res.samples['t1'].dtype == np.float32
+    assert res.discrepancies.dtype == np.float32
+    assert np.all(np.diff(res.discrepancies) >= 0)
+
+
 @pytest.mark.usefixtures('with_all_clients')
 def test_smc_with_thresholds():
     m, true_params = setup_ma2_with_informative_data()
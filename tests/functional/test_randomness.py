@@ -44,6 +44,15 @@ def test_global_random_state_usage(simple_model):
     assert random_state_equal(st1, st2)
 
 
+def test_unsupported_seed():
+    m = elfi.ElfiModel()
+    c = elfi.Constant(1., model=m)
+    op = elfi.Operation(lambda x: x + 1, c, model=m)
+
+    with pytest.raises(ValueError):
+        m.generate(outputs=[op.name], seed='unsupported')
+
+
 def test_get_sub_seed():
     n = 100
     seed = np.random.randint(2**31)
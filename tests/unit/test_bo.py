@@ -68,6 +68,58 @@ def test_BO_works_with_zero_init_samples(ma2):
     assert bo.n_initial_evidence == 0
 
 
+@pytest.mark.usefixtures('with_all_clients')
+def test_optimization_restarts(ma2):
+    bounds = {n: (-2, 2) for n in ma2.parameter_names}
+    bo = elfi.BayesianOptimization(
+        ma2, 'd', initial_evidence=10, update_interval=10, bounds=bounds, seed=1)
+    bo.infer(10)
+    x_single, val_single = bo._minimize_target_mean()
+
+    bo.n_optimization_restarts = 3
+    x_min, val_min = bo._minimize_target_mean()
+    assert val_min <= val_single
+    assert len(bo.extract_result().x_min) == len(ma2.parameter_names)
+
+
+def test_acquisition_is_shared_between_batches(ma2):
+    bounds = {n: (-2, 2) for n in ma2.parameter_names}
+    bo = elfi.BayesianOptimization(
+        ma2, 'd', initial_evidence=4, update_interval=100, batch_size=1, bounds=bounds,
+        batches_per_acquisition=3, max_parallel_batches=3)
+
+    acquire = bo.acquisition_method.acquire
+    n_acquired = []
+
+    def counting_acquire(n, t=None):
+        n_acquired.append(n)
+        return acquire(n, t=t)
+
+    bo.acquisition_method.acquire = counting_acquire
+    bo.infer(4 + 6)
+    assert n_acquired == [3, 3]
+
+
+def test_gp_sampling_cache():
+    bounds = {'a': [-2, 3], 'b': [5, 6]}
+    gp = GPyRegression(['a', 'b'], bounds=bounds)
+    x = np.column_stack((np.random.uniform(*bounds['a'], 30), np.random.uniform(*bounds['b'], 30)))
+    gp.update(x, np.random.rand(30))
+
+    x_test = x[:4] + 0.1
+    mean, var = gp.predict(x_test)
+    grads = [gp.predictive_gradients(x_)[1] for x_ in x_test]
+
+    # the cached implementation for the default kernel must agree with GPy
+    gp.is_sampling = True
+    mean_cached, var_cached = gp.predict(x_test)
+    assert var_cached.shape == var.shape
+    assert np.allclose(mean_cached, mean)
+    assert np.allclose(var_cached, var)
+    for x_, grad in zip(x_test, grads):
+        assert np.allclose(gp.predictive_gradients(x_)[1], grad)
+
+
 def test_acquisition():
     n_params = 2
     n = 10
@@ -124,6 +176,29 @@ def test_acquisition():
     assert np.all((new[:, 1] >= bounds['b'][0]) & (new[:, 1] <= bounds['b'][1]))
 
 
+def test_lcbsc_subclass_evaluate():
+    bounds = {'a': [-2, 3], 'b': [5, 6]}
+    target_model = GPyRegression(['a', 'b'], bounds=bounds)
+    x = np.column_stack((np.random.uniform(*bounds['a'], 10),
+                         np.random.uniform(*bounds['b'], 10)))
+    target_model.update(x, np.random.rand(10))
+    x_test = x[:1] + 0.1
+
+    lcbsc = acquisition.LCBSC(target_model)
+    value, gradient = lcbsc.evaluate_with_gradient(x_test, t=1)
+    assert np.allclose(value, lcbsc.evaluate(x_test, t=1))
+    assert np.allclose(gradient, lcbsc.evaluate_gradient(x_test, t=1))
+
+    class ShiftedLCBSC(acquisition.LCBSC):
+        def evaluate(self, x, t=None):
+            return super(ShiftedLCBSC, self).evaluate(x, t) + 1
+
+    shifted = ShiftedLCBSC(target_model)
+    value, gradient = shifted.evaluate_with_gradient(x_test, t=1)
+    assert np.allclose(value, lcbsc.evaluate(x_test, t=1) + 1)
+    assert np.allclose(gradient, lcbsc.evaluate_gradient(x_test, t=1))
+
+
 class Test_MaxVar:
     """Run a collection of tests for the MaxVar acquisition."""
 
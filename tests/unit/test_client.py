@@ -29,6 +29,23 @@ def test_batch_handler(simple_model):
     assert not np.array_equal(out0['k2'], out1['k2'])
 
 
+@pytest.mark.usefixtures('with_all_clients')
+def test_scatter():
+    client = elfi.get_client()
+    data = np.arange(10)
+    handle = client.scatter(data)
+    ids = [client.apply(np.sum, handle) for i in range(3)]
+    assert [client.get_result(id) for id in ids] == [45] * 3
+
+
+def test_dask_apply_pure(client):
+    if not isinstance(client, elfi.clients.dask.Client):
+        pytest.skip("Only the dask client takes the pure option")
+
+    ids = [client.apply(np.sum, np.arange(10)), client.apply(np.sum, np.arange(10), pure=True)]
+    assert [client.get_result(id) for id in ids] == [45] * 2
+
+
 def test_multiprocessing_kwargs(simple_model):
     pre = elfi.get_client()
 
@@ -43,6 +43,30 @@ class TestNUTS():
         cov = np.cov(samples[n_adapt:, :].T)
         assert np.allclose(cov, true_cov, atol=0.1, rtol=0.1)
 
+    def test_nuts_inv_mass(self):
+        n_samples = 20000
+        n_adapt = 2000
+        x_init = np.random.rand(n)
+        for inv_mass in [np.diag(true_cov), true_cov]:
+            samples = mcmc.nuts(n_samples, x_init, log_pdf, grad_log_pdf, n_adapt=n_adapt,
+                                inv_mass=inv_mass)
+            assert samples.shape == (n_samples, n)
+            cov = np.cov(samples[n_adapt:, :].T)
+            assert np.allclose(cov, true_cov, atol=0.3, rtol=0.1)
+
+        with pytest.raises(ValueError):
+            mcmc.nuts(10, x_init, log_pdf, grad_log_pdf, inv_mass=np.ones(n + 1))
+
+    def test_nuts_adapt_max_depth(self):
+        n_samples = 20000
+        n_adapt = 2000
+        x_init = np.random.rand(n)
+        samples = mcmc.nuts(n_samples, x_init, log_pdf, grad_log_pdf, n_adapt=n_adapt,
+                            adapt_max_depth=True)
+        assert samples.shape == (n_samples, n)
+        cov = np.cov(samples[n_adapt:, :].T)
+        assert np.allclose(cov, true_cov, atol=0.3, rtol=0.1)
+
 
 # some data generated in PyStan
 chains_Stan = np.array([[0.2955857, 1.27937191, 1.05884099, 0.91236858], [
@@ -66,3 +90,13 @@ def test_ESS():
 
 def test_Rhat():
     assert np.isclose(mcmc.gelman_rubin_statistic(chains_Stan), Rhat_Stan, atol=0.01)
+
+
+def test_diagnostics_for_several_parameters():
+    chains = np.random.randn(3, 100, 4).cumsum(axis=1)
+    ess = mcmc.eff_sample_size(chains)
+    rhat = mcmc.gelman_rubin_statistic(chains)
+    assert ess.shape == rhat.shape == (4, )
+    for i in range(4):
+        assert np.isclose(ess[i], mcmc.eff_sample_size(chains[:, :, i]))
+        assert np.isclose(rhat[i], mcmc.gelman_rubin_statistic(chains[:, :, i]))
@@ -94,6 +94,10 @@ def test_BOLFI_short(ma2, distribution_test):
 
     distribution_test(post, rvs=(acq_x[0, :], acq_x[1:2, :], acq_x[2:4, :]))
 
+    # the default threshold is reused until the GP changes
+    assert bolfi.extract_posterior().threshold == post.threshold
+    assert bolfi.extract_posterior(threshold=1.).threshold == 1.
+
     n_samples = 10
     n_chains = 2
     res_sampling_nuts = bolfi.sample(n_samples, n_chains=n_chains)
@@ -117,3 +121,124 @@ def test_BOLFI_short(ma2, distribution_test):
     grad_cached_mu, grad_cached_var = bolfi.target_model.predictive_gradients(x)
     assert (np.allclose(grad_mu[:, :, 0], grad_cached_mu))
     assert (np.allclose(grad_var, grad_cached_var))
+
+
+_bolfi_bounds = {'t1': (-2, 2), 't2': (-1, 1)}
+
+
+# A BOLFI with the GP fitted to 20 points of the log discrepancy
+def _fit_bolfi(ma2, seed, **kwargs):
+    log_d = elfi.Operation(np.log, ma2['d'])
+    bolfi = elfi.BOLFI(log_d, initial_evidence=10, update_interval=10, batch_size=5,
+                       bounds=_bolfi_bounds, seed=seed, **kwargs)
+    bolfi.fit(20, bar=False)
+    return bolfi
+
+
+def test_BOLFI_chains_sharing_a_posterior(ma2):
+    # Clients may give the same posterior object to chains running in parallel threads
+    from concurrent.futures import ThreadPoolExecutor
+    from elfi.methods.inference.bolfi import _sample_chain
+
+    bolfi = _fit_bolfi(ma2, seed=1)
+    posterior = bolfi.extract_posterior()
+    bolfi.target_model.is_sampling = True
+    initial = bolfi.target_model.X[np.argmin(bolfi.target_model.Y)]
+
+    def sample(seed):
+        return _sample_chain('nuts', posterior, 20, initial, n_adapt=10, seed=seed)
+
+    expected = [sample(seed) for seed in range(4)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        chains = list(executor.map(sample, range(4)))
+    for chain, expected_chain in zip(chains, expected):
+        assert np.array_equal(chain, expected_chain)
+
+
+def test_BOLFI_chains_do_not_copy_the_gp(ma2, monkeypatch):
+    import copy
+    from GPy.core import GP
+    from elfi.methods.bo.gpy_regression import GPyRegression
+
+    monkeypatch.setattr(elfi.client, '_client', elfi.clients.native.Client())
+    bolfi = _fit_bolfi(ma2, seed=1)
+    posterior = bolfi.extract_posterior()
+
+    def no_copy(*args, **kwargs):
+        raise AssertionError('The GP should be shared by the chains')
+    for cls in [GP, GPyRegression]:
+        monkeypatch.setattr(cls, 'copy', no_copy)
+        monkeypatch.setattr(cls, '__deepcopy__', no_copy, raising=False)
+    with pytest.raises(AssertionError):
+        copy.deepcopy(posterior)
+
+    bolfi.sample(20, n_chains=3, warmup=10)
+    assert bolfi.target_model._rbf_is_cached
+
+
+def test_BOLFI_chains_copy_the_gp_with_a_custom_kernel(ma2, monkeypatch):
+    import copy
+    import GPy
+    from elfi.methods.bo.gpy_regression import GPyRegression
+    from elfi.methods.posteriors import BolfiPosterior
+
+    monkeypatch.setattr(elfi.client, '_client', elfi.clients.native.Client())
+    target_model = GPyRegression(['t1', 't2'], bounds=_bolfi_bounds, kernel=GPy.kern.RBF(2))
+    bolfi = _fit_bolfi(ma2, seed=1, target_model=target_model)
+
+    n_copies = []
+    deepcopy = copy.deepcopy
+
+    def counting_deepcopy(x, *args, **kwargs):
+        n_copies.append(x)
+        return deepcopy(x, *args, **kwargs)
+    monkeypatch.setattr(copy, 'deepcopy', counting_deepcopy)
+
+    bolfi.sample(20, n_chains=3, warmup=10)
+    assert not bolfi.target_model._rbf_is_cached
+    assert sum(isinstance(x, BolfiPosterior) for x in n_copies) == 3
+
+
+def test_BOLFI_sample_inv_mass(ma2):
+    bolfi = _fit_bolfi(ma2, seed=2)
+
+    for inv_mass in ['hessian', np.array([0.5, 0.2]), np.array([[0.5, 0.1], [0.1, 0.2]])]:
+        res = bolfi.sample(20, n_chains=2, inv_mass=inv_mass)
+        assert res.samples_array.shape == (20, 2)
+        assert np.all(np.isfinite(res.samples_array))
+        res_again = bolfi.sample(20, n_chains=2, inv_mass=inv_mass)
+        assert np.array_equal(res.chains, res_again.chains)
+
+    inv_mass = bolfi._estimate_inv_mass(bolfi.extract_posterior(), bolfi.target_model.X[0])
+    assert np.allclose(inv_mass, inv_mass.T)
+    assert np.all(np.linalg.eigvalsh(inv_mass) > 0)
+
+    with pytest.raises(ValueError):
+        bolfi.sample(20, n_chains=2, inv_mass='unknown')
+    with pytest.raises(ValueError):
+        bolfi.sample(20, n_chains=2, algorithm='metropolis', sigma_proposals=np.ones(2),
+                     inv_mass='hessian')
+
+
+def test_BOLFI_default_threshold_follows_gp(ma2):
+    from elfi.methods.posteriors import BolfiPosterior
+
+    bolfi = _fit_bolfi(ma2, seed=3)
+    threshold = bolfi.extract_posterior().threshold
+    assert bolfi.extract_posterior().threshold == threshold
+
+    # Changing the GP hyperparameters without new evidence invalidates the cached threshold
+    gp = bolfi.target_model.instance
+    gp.kern.rbf.lengthscale = 5 * gp.kern.rbf.lengthscale
+    expected = BolfiPosterior(bolfi.target_model, prior=bolfi._prior).threshold
+    assert expected != threshold
+    assert np.isclose(bolfi.extract_posterior().threshold, expected)
+
+    bolfi.target_model.optimize()
+    expected = BolfiPosterior(bolfi.target_model, prior=bolfi._prior).threshold
+    assert np.isclose(bolfi.extract_posterior().threshold, expected)
+
+    # New evidence replaces the GP instance
+    bolfi.fit(25, bar=False)
+    expected = BolfiPosterior(bolfi.target_model, prior=bolfi._prior).threshold
+    assert np.isclose(bolfi.extract_posterior().threshold, expected)
@@ -0,0 +1,122 @@
+import types
+
+import numpy as np
+import pytest
+import scipy.spatial as spatial
+import scipy.stats as ss
+
+from elfi.methods.inference.romc import ROMC, RegionConstructor, RomcOpimisationResult
+
+
+def linear_limit(func, theta_0, direction, eps, step, nof_points):
+    """Walk along direction one step at a time, as the original region search did."""
+    point = theta_0.copy()
+    for i in range(1, nof_points + 1):
+        point += step * direction
+        if func(point) > eps:
+            return i * step - step / 2
+    return (nof_points - 1) * step if nof_points > 0 else 0
+
+
+def monotone_func(theta):
+    return np.sum(theta**2)
+
+
+def nonmonotone_func(theta):
+    # Exceeds eps=1 on the shell 1 < |theta| < 1.5 and again beyond |theta| = 3
+    r = np.sqrt(np.sum(theta**2))
+    return 2. if 1 < r < 1.5 or r > 3 else 0.
+
+
+class TestFindLimit:
+    @pytest.mark.parametrize('nof_points', [0, 1, 2, 3, 10, 200])
+    @pytest.mark.parametrize('direction', [np.array([1., 0.]), np.array([-0.6, 0.8])])
+    def test_monotone(self, nof_points, direction):
+        theta_0 = np.array([0.1, -0.2])
+        for find_limit in [RegionConstructor._find_limit, RegionConstructor._find_limit_linear]:
+            limit = find_limit(monotone_func, theta_0, direction, 1., 0.05, nof_points)
+            assert limit == linear_limit(monotone_func, theta_0, direction, 1., 0.05, nof_points)
+
+    def test_nonmonotone(self):
+        theta_0 = np.zeros(2)
+        direction = np.array([1., 0.])
+        expected = linear_limit(nonmonotone_func, theta_0, direction, 1., 0.1, 50)
+        assert np.isclose(expected, 1.05)
+
+        limit = RegionConstructor._find_limit_linear(
+            nonmonotone_func, theta_0, direction, 1., 0.1, 50)
+        assert limit == expected
+
+        # The bisection may skip the first crossing but never ends inside it
+        limit = RegionConstructor._find_limit(nonmonotone_func, theta_0, direction, 1., 0.1, 50)
+        assert limit >= expected
+        assert nonmonotone_func(theta_0 + (limit + 0.05) * direction) > 1.
+
+    def test_linear_by_default(self):
+        result = RomcOpimisationResult(np.zeros(2), 0., hess=np.eye(2))
+        constructor = RegionConstructor(result, nonmonotone_func, 2, eps_region=1., lim=5,
+                                        step=0.1)
+        box = constructor.build()[0]
+        assert np.allclose(np.abs(box.limits), 1.05)
+
+    @pytest.mark.parametrize('monotone', [True, False])
+    def test_lim_smaller_than_step(self, monotone):
+        theta_0 = np.array([0.3, 0.4])
+        result = RomcOpimisationResult(theta_0, 0., hess=np.eye(2))
+        constructor = RegionConstructor(result, monotone_func, 2, eps_region=1., lim=0.01,
+                                        step=0.05, monotone=monotone)
+        box = constructor.build()[0]
+        assert np.allclose(box.limits, [[-0.025, 0.025], [-0.025, 0.025]])
+
+    @pytest.mark.parametrize('monotone', [True, False])
+    def test_build(self, monotone):
+        theta_0 = np.array([0.3, 0.4])
+        result = RomcOpimisationResult(theta_0, 0., hess=np.diag([1., 4.]))
+        constructor = RegionConstructor(result, lambda x: np.sum((x - theta_0)**2), 2,
+                                        eps_region=1., lim=10, step=0.05, monotone=monotone)
+        box = constructor.build()[0]
+        assert np.allclose(np.abs(box.limits), 1.025)
+
+
+class TestDivergence:
+    def romc(self, posterior_pdf, dim):
+        # A ROMC instance with only the fitted posterior that the divergences need
+        romc = ROMC.__new__(ROMC)
+        romc.posterior = types.SimpleNamespace(pdf_unnorm_batched=posterior_pdf)
+        romc.inference_state = {"_has_defined_posterior": True}
+        romc.bounds = [(-10, 10)] * dim
+        romc.left_lim = np.full(dim, -10.)
+        romc.right_lim = np.full(dim, 10.)
+        return romc
+
+    def test_1d(self):
+        p = ss.norm(0, 1)
+        q = ss.norm(1, 1.5)
+        # The ROMC posterior is unnormalized
+        romc = self.romc(lambda theta: 3 * p.pdf(theta[:, 0]), 1)
+
+        kl = romc._estimate_divergence(q.pdf, q.rvs, 100000, "KL-Divergence", seed=1)
+        kl_true = np.log(1.5) + (1 + 1) / (2 * 1.5**2) - 0.5
+        assert np.isclose(kl, kl_true, atol=0.01)
+
+        x = np.linspace(-15, 15, 30001)
+        js_grid = spatial.distance.jensenshannon(p.pdf(x), q.pdf(x))
+        js = romc._estimate_divergence(q.pdf, q.rvs, 100000, "Jensen-Shannon", seed=1)
+        assert np.isclose(js, js_grid, atol=0.01)
+
+    def test_3d(self):
+        p = ss.multivariate_normal(np.zeros(3), np.eye(3))
+        q = ss.multivariate_normal(np.full(3, .5), np.eye(3))
+        romc = self.romc(lambda theta: 5 * p.pdf(theta), 3)
+
+        kl = romc.compute_divergence(q.pdf, distance="KL-Divergence", gt_sampler=q.rvs,
+                                     n_mc=100000, seed=2)
+        assert np.isclose(kl, 0.5 * 3 * 0.5**2, atol=0.01)
+
+        js = romc.compute_divergence(q.pdf, gt_sampler=q.rvs, n_mc=20000, seed=3)
+        assert 0 < js < 1
+        assert js == romc.compute_divergence(q.pdf, gt_sampler=q.rvs, n_mc=20000, seed=3)
+        assert js != romc.compute_divergence(q.pdf, gt_sampler=q.rvs, n_mc=20000, seed=4)
+
+        # Without a sampler the divergence is not computed for D > 2
+        assert romc.compute_divergence(q.pdf) is None
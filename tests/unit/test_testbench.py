@@ -1,9 +1,12 @@
+import multiprocessing
+
 import numpy as np
 from numpy.lib.function_base import quantile
 import pytest
 
 import elfi
 import elfi.examples.ma2 as exma2
+import elfi.testbench.testbench as testbench_module
 from elfi.methods.inference.parameter_inference import ParameterInference
 
 
@@ -109,3 +112,135 @@ def test_testbench_seeding(ma2):
     assert np.all(
         [a == b for a, b in zip(testbench1.observations, testbench2.observations)]
         )
+
+
+@pytest.mark.parametrize('start_method', ['fork', 'spawn'])
+def test_testbench_parallel_repetitions(ma2, start_method, monkeypatch):
+
+    if start_method not in multiprocessing.get_all_start_methods():
+        pytest.skip('The {} start method is not available'.format(start_method))
+    monkeypatch.setattr(testbench_module, 'Pool',
+                        multiprocessing.get_context(start_method).Pool)
+
+    method = elfi.TestbenchMethod(method=elfi.Rejection, name='Rejection')
+    method.set_method_kwargs(discrepancy_name='d', batch_size=500)
+    method.set_sample_kwargs(n_samples=100, bar=False)
+
+    results = []
+    for num_processes in [1, 2]:
+        testbench = elfi.Testbench(model=ma2,
+                                   repetitions=3,
+                                   seed=156,
+                                   progress_bar=False,
+                                   num_processes=num_processes)
+        testbench.add_method(method)
+        testbench.run()
+        results.append(testbench.get_testbench_results()['results'][0]['results'])
+
+    for sequential, parallel in zip(*results):
+        assert np.array_equal(sequential.samples_array, parallel.samples_array)
+
+
+def test_testbench_sample_mean_differences(ma2):
+
+    method = elfi.TestbenchMethod(method=elfi.Rejection, name='Rejection')
+    method.set_method_kwargs(discrepancy_name='d', batch_size=500)
+    method.set_sample_kwargs(n_samples=100, bar=False)
+
+    testbench = elfi.Testbench(model=ma2,
+                               repetitions=3,
+                               seed=156,
+                               progress_bar=False)
+    testbench.add_method(method)
+    testbench.run()
+
+    differences = testbench.parameterwise_sample_mean_differences()['Rejection']
+    results = testbench.get_testbench_results()['results'][0]['results']
+    for param in ma2.parameter_names:
+        for i, result in enumerate(results):
+            expected = result.sample_means[param] - testbench.reference_parameter[param][i]
+            assert np.isclose(differences[param][i], expected)
+
+
+def test_testbench_sample_mean_differences_vector_parameter():
+
+    m = elfi.new_model()
+    t = elfi.Prior('multivariate_normal', [0, 0], np.eye(2), model=m, name='t')
+    sim = elfi.Simulator(lambda t, batch_size=1, random_state=None: np.reshape(t, (-1, 2)), t,
+                         observed=np.array([[0., 0.]]), name='sim')
+    elfi.Distance('euclidean', sim, name='d')
+
+    method = elfi.TestbenchMethod(method=elfi.Rejection, name='Rejection')
+    method.set_method_kwargs(discrepancy_name='d', batch_size=100)
+    method.set_sample_kwargs(n_samples=10, bar=False)
+
+    reference = np.array([.3, -.2])
+    testbench = elfi.Testbench(model=m,
+                               reference_parameter={'t': reference},
+                               repetitions=3,
+                               seed=99,
+                               progress_bar=False)
+    testbench.add_method(method)
+    testbench.run()
+
+    assert testbench.reference_parameter['t'].shape == (3, 2)
+    assert np.allclose(testbench.observations, reference)
+
+    differences = testbench.parameterwise_sample_mean_differences()['Rejection']['t']
+    results = testbench.get_testbench_results()['results'][0]['results']
+    assert differences.shape == (3, 2)
+    for difference, result in zip(differences, results):
+        assert np.allclose(difference, result.sample_means['t'] - reference)
+
+
+def test_testbench_generated_observations_match_parameters():
+
+    m = elfi.new_model()
+    t1 = elfi.Prior('uniform', 0, 1, model=m, name='t1')
+    sim = elfi.Simulator(lambda t1, batch_size=1, random_state=None: 2 * t1, t1,
+                         observed=np.array([1.]), name='sim')
+    elfi.Distance('euclidean', sim, name='d')
+
+    testbench = elfi.Testbench(model=m,
+                               repetitions=4,
+                               seed=99,
+                               progress_bar=False)
+
+    assert np.allclose(testbench.observations, 2 * testbench.reference_parameter['t1'])
+
+
+def test_testbench_parallel_falls_back_without_pickling(monkeypatch, caplog):
+
+    m = elfi.new_model()
+    t1 = elfi.Prior('uniform', 0, 1, model=m, name='t1')
+    sim = elfi.Simulator(lambda t1, batch_size=1, random_state=None: 2 * t1, t1,
+                         observed=np.array([1.]), name='sim')
+    elfi.Distance('euclidean', sim, name='d')
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError('The repetitions should not be run in parallel')
+    monkeypatch.setattr(testbench_module, 'Pool', no_pool)
+
+    method = elfi.TestbenchMethod(method=elfi.Rejection, name='Rejection')
+    method.set_method_kwargs(discrepancy_name='d', batch_size=100)
+    method.set_sample_kwargs(n_samples=10, bar=False)
+
+    testbench = elfi.Testbench(model=m,
+                               repetitions=2,
+                               seed=99,
+                               progress_bar=False,
+                               num_processes=2)
+    testbench.add_method(method)
+    testbench.run()
+
+    assert 'sequentially' in caplog.text
+    assert len(testbench.get_testbench_results()['results'][0]['results']) == 2
+
+
+def test_testbench_worker_uses_native_client(ma2, monkeypatch):
+
+    # Stands for a client inherited from the parent process
+    monkeypatch.setattr(elfi.client, '_client', object())
+    testbench_module._init_worker(ma2, 'MA2')
+
+    assert isinstance(elfi.client.get_client(), elfi.clients.native.Client)
@@ -1,14 +1,19 @@
 import json
+import pickle
+import warnings
 from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
+import pytest
 import scipy.stats as ss
 
 import elfi
 from elfi.examples.ma2 import get_model
 from elfi.methods.bo.utils import minimize, stochastic_optimization
 from elfi.methods.density_ratio_estimation import DensityRatioEstimation
-from elfi.methods.utils import (GMDistribution, normalize_weights, numgrad, numpy_to_python_type,
+from elfi.methods.utils import (GMDistribution, NDimBoundingBox, batch_to_arr2d,
+                                normalize_weights, numgrad, numpy_to_python_type,
                                 sample_object_to_dict, weighted_sample_quantile, weighted_var)
 from elfi.model.extensions import ModelPrior
 
@@ -89,6 +94,14 @@ def test_weighted_var():
     assert np.linalg.norm(weighted_var(x, w) - np.diag(cov)) < .1
 
 
+def test_batch_to_arr2d():
+    batches = [dict(a=np.array([1., 2.]), b=np.array([3., 4.])),
+               dict(a=np.array([5.]), b=np.array([6.]))]
+    expected = np.array([[1., 3.], [2., 4.], [5., 6.]])
+    assert np.array_equal(batch_to_arr2d(batches, ['a', 'b']), expected)
+    assert np.array_equal(batch_to_arr2d(batches[0], ['b', 'a']), expected[:2, ::-1])
+
+
 class TestGMDistribution:
     def test_pdf(self, distribution_test):
         # 1d case
@@ -120,6 +133,31 @@ class TestGMDistribution:
         # Distribution_test with 3d means
         distribution_test(GMDistribution, means, weights=weights)
 
+    def test_pdf_diagonal_cov(self):
+        x = [[1, 2, -1], [0, 0, 2]]
+        means = [[0, 0, 0], [-1, -.2, .1]]
+        weights = normalize_weights([.4, .1])
+        var = np.array([.5, 2, 1.5])
+
+        d = GMDistribution.pdf(x, means, cov=var, weights=weights)
+        d_full = GMDistribution.pdf(x, means, cov=np.diag(var), weights=weights)
+        d_true = weights[0] * ss.multivariate_normal.pdf(x, mean=means[0], cov=np.diag(var)) + \
+            weights[1] * ss.multivariate_normal.pdf(x, mean=means[1], cov=np.diag(var))
+        assert np.allclose(d, d_true)
+        assert np.allclose(d_full, d_true)
+
+    def test_pdf_far_apart_narrow_components(self):
+        means = 1e6 * np.array([[1, 1], [-1, -1]])
+        cov = 1e-6 * np.eye(2)
+        x = means[0] + [1e-3, -1e-3]
+        d = GMDistribution.logpdf(x, means, cov=cov)
+        d_true = np.log(.5) + ss.multivariate_normal.logpdf(x, mean=means[0], cov=cov)
+        assert np.isclose(d, d_true)
+
+        # Diagonal covariance given as variances
+        d_diag = GMDistribution.logpdf(x, means, cov=1e-6 * np.ones(2))
+        assert np.isclose(d_diag, d_true)
+
     def test_rvs(self):
         means = [[1000, 3], [-1000, -3]]
         weights = [.3, .7]
@@ -144,6 +182,19 @@ class TestGMDistribution:
         # Ensure prior pdf > 0 for all samples
         assert np.all(np.isfinite(prior_logpdf(rvs)))
 
+    def test_rvs_prior_accepting_all(self):
+        means = [0.8, 0.5]
+        weights = [.3, .7]
+        N = 100
+        prior_logpdf = ss.norm.logpdf
+        rvs = GMDistribution.rvs(means, weights=weights, size=N,
+                                 random_state=np.random.RandomState(123))
+        rvs_prior = GMDistribution.rvs(means, weights=weights, size=N, prior_logpdf=prior_logpdf,
+                                       random_state=np.random.RandomState(123))
+
+        # No oversampling is needed when nothing is rejected
+        assert np.array_equal(rvs, rvs_prior)
+
 
 def test_numgrad():
     assert np.allclose(numgrad(lambda x: np.log(x), 3), [1 / 3])
@@ -151,6 +202,20 @@ def test_numgrad():
     assert np.allclose(numgrad(lambda x: np.sum(x, axis=1), [1, 3, 5]), [1, 1, 1])
 
 
+def test_numgrad_neg_inf():
+    def logpdf(x):
+        return np.sum(ss.uniform(0, 1).logpdf(x), axis=1) + x[:, 1]
+
+    # Only the dimension at the support boundary is zeroed
+    assert np.allclose(numgrad(logpdf, [0, .5]), [0, 1])
+
+    # Outside the support all the dimensions are zeroed without warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        grad = numgrad(logpdf, [-1, .5])
+    assert np.array_equal(grad, [0, 0])
+
+
 class TestModelPrior:
     def test_basics(self, ma2, distribution_test):
         # A 1D case
@@ -184,6 +249,40 @@ class TestModelPrior:
         num_grad = ModelPrior(prior_node.model).gradient_logpdf(x)
         assert np.isclose(num_grad, analytical_grad_logpdf, atol=0.01)
 
+    def test_threaded_logpdf(self):
+        m = elfi.ElfiModel()
+        elfi.Prior('normal', 1, 2, model=m, name='a')
+        elfi.Prior('normal', -1, 3, model=m, name='b')
+        prior = ModelPrior(m)
+
+        def expected(x):
+            return ss.norm.logpdf(x[:, 0], 1, 2) + ss.norm.logpdf(x[:, 1], -1, 3)
+
+        def evaluate(i):
+            # Vary the batch size, so that the loaded nets are also replaced
+            x = np.random.RandomState(i).randn(1 + i % 3, 2)
+            return np.allclose(prior.logpdf(x), expected(x))
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            assert all(executor.map(evaluate, range(2000)))
+
+    def test_logpdf_recovers_from_errors(self, ma2):
+        prior = ModelPrior(ma2)
+        x = prior.rvs(size=3)
+        expected = ModelPrior(ma2).logpdf(x)
+        # Fails while computing the density of the second parameter
+        invalid = np.array([[0.1, 'a']] * 3, dtype=object)
+        for x_invalid in [invalid, invalid[:, ::-1]]:
+            with pytest.raises(TypeError):
+                prior.logpdf(x_invalid)
+            assert np.allclose(prior.logpdf(x), expected)
+
+    def test_pickle(self, ma2):
+        prior = ModelPrior(ma2)
+        x = prior.rvs(size=3)
+        expected = prior.logpdf(x)
+        assert np.allclose(pickle.loads(pickle.dumps(prior)).logpdf(x), expected)
+
 
 def test_sample_object_to_dict():
     data_rej = OrderedDict()
@@ -218,6 +317,31 @@ def test_numpy_to_python_type():
     assert is_jsonable(data) is True
 
 
+def test_bounding_box_contains_many():
+    rotation = np.array([[0, -1], [1, 0]])
+    bb = NDimBoundingBox(rotation, np.array([1, 1]), np.array([[-1, 1], [-2, 2]]), eps_region=1)
+    points = np.array([[1, 1], [2.5, 1.5], [0.5, 0], [1.5, 2.5]])
+    inside = bb.contains_many(points)
+    assert inside.tolist() == [bb.contains(p) for p in points] == [True, True, True, False]
+    assert np.array_equal(bb.pdf(points), inside / bb.volume)
+
+
+def test_bounding_box_sample_seeding():
+    rotation = np.array([[0, -1], [1, 0]])
+    bb = NDimBoundingBox(rotation, np.array([1, 1]), np.array([[-1, 1], [-2, 2]]), eps_region=1)
+    samples = bb.sample(20, seed=1)
+    assert samples.shape == (20, 2)
+    assert np.all(bb.contains_many(samples))
+    assert np.array_equal(bb.sample(20, seed=1), samples)
+    assert np.array_equal(bb.sample(20, seed=np.random.RandomState(1)), samples)
+
+    # Without a seed the global random state is used
+    np.random.seed(2)
+    samples = bb.sample(20)
+    np.random.seed(2)
+    assert np.array_equal(bb.sample(20), samples)
+
+
 class TestDensityRatioEstimation:
     def test_shapes(self):
         N = 100